@@ -1,10 +1,28 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, get_jwt
 import requests
+import logging
 import os
+import re
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
+from urllib.parse import unquote, urlsplit
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import generate_etag, quote_etag
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from common.admission import CRITICAL, NORMAL, SHEDDABLE, OverloadedError, init_admission, request_limiter
+from common.cache import TTLCache
+from common.circuit_breaker import CircuitOpenError, init_circuit_breakers
+from common.deadline import DeadlineExceeded, budget_headers, init_deadlines, without_deadline
+from common.http_client import ServiceClient
+from common.metrics import init_metrics
+from common.tracing import init_tracing, outgoing_headers, submit_in_context
 
 load_dotenv()
 
@@ -13,9 +31,24 @@ app = Flask(__name__)
 # JWT Configuration
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'your_super_secret_jwt_key_change_this_in_production')
 app.config['JWT_ALGORITHM'] = os.getenv('JWT_ALGORITHM', 'HS256')
+# EventSource cannot send headers, so the order stream also accepts ?token=<jwt>
+app.config['JWT_QUERY_STRING_NAME'] = 'token'
+
+
+class RedactTokenFilter(logging.Filter):
+    """Keep ?token=<jwt> of the order stream out of the access log"""
+    pattern = re.compile(r'([?&]token=)[^&\s"]+')
+
+    def filter(self, record):
+        record.msg = self.pattern.sub(r'\1[redacted]', record.getMessage())
+        record.args = ()
+        return True
+
+
+logging.getLogger('werkzeug').addFilter(RedactTokenFilter())
 
 jwt = JWTManager(app)
-CORS(app)
+CORS(app, expose_headers=['X-Request-ID', 'Server-Timing'])
 
 # Configure JWT token expiration (24 hours)
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
@@ -39,6 +72,196 @@ RESTAURANT_SERVICE_URL = os.getenv('RESTAURANT_SERVICE_URL', 'http://localhost:5
 MENU_SERVICE_URL = os.getenv('MENU_SERVICE_URL', 'http://localhost:5003')
 ORDER_SERVICE_URL = os.getenv('ORDER_SERVICE_URL', 'http://localhost:5004')
 
+# Keep-alive HTTP clients, one connection pool per backend (see common/http_client.py),
+# each with an adaptive concurrency limit (see common/admission.py). Order change events live in
+# the Order Service process that made the change, so with several order replicas, order writes
+# and the event stream go to the primary replica (failing over when it is down) and only reads
+# are balanced.
+customer_client = ServiceClient(CUSTOMER_SERVICE_URL, name='customer_service', limiter=request_limiter('customer_service'))
+restaurant_client = ServiceClient(RESTAURANT_SERVICE_URL, name='restaurant_service', limiter=request_limiter('restaurant_service'))
+menu_client = ServiceClient(MENU_SERVICE_URL, name='menu_service', limiter=request_limiter('menu_service'))
+order_client = ServiceClient(
+    ORDER_SERVICE_URL, name='order_service', limiter=request_limiter('order_service'),
+    pin_to_primary=lambda method, path: method != 'GET' or path == '/orders/events'
+)
+backend_clients = (customer_client, restaurant_client, menu_client, order_client)
+
+# Response cache for the public catalog routes (menus, restaurants)
+catalog_cache = TTLCache(
+    max_entries=int(os.getenv('CATALOG_CACHE_MAX_ENTRIES', 256)),
+    ttl=float(os.getenv('CATALOG_CACHE_TTL', 30)),
+    name='catalog'
+)
+
+# Generates or accepts X-Request-ID and forwards it to every service; spans and Server-Timing (see common/tracing.py)
+init_tracing(app, 'api_gateway')
+
+# Request timing, HTTP pool, cache and concurrency limit gauges on GET /metrics (see common/metrics.py)
+init_metrics(
+    app, 'api_gateway',
+    http_clients=list(backend_clients),
+    stats_sources={
+        'cache': [catalog_cache],
+        'admission': [client.limiter for client in backend_clients if client.limiter is not None]
+    }
+)
+
+# Every request gets a time budget (a smaller X-Request-Budget-Ms from the client wins); the remainder
+# is forwarded to each service and down to MySQL, and the request fails with 504 once it is spent
+GATEWAY_REQUEST_BUDGET_MS = int(os.getenv('GATEWAY_REQUEST_BUDGET_MS', 10000))
+init_deadlines(app, default_budget_ms=GATEWAY_REQUEST_BUDGET_MS)
+
+# A failing backend gets a per-client circuit breaker; its routes answer 503 at once while it is open
+init_circuit_breakers(app)
+
+# Admission priority when a backend is at its concurrency limit: checkout and order status
+# updates come first, anonymous catalog browsing is shed first (429/503 with Retry-After)
+CRITICAL_ROUTES = {
+    ('POST', '/api/orders'),
+    ('POST', '/api/checkout'),
+    ('PATCH', '/api/orders/<int:order_id>/status'),
+    ('PATCH', '/api/orders/status')
+}
+
+def request_priority():
+    """Admission priority of the current request (see common/admission.py)"""
+    rule = request.url_rule.rule if request.url_rule else None
+    if (request.method, rule) in CRITICAL_ROUTES:
+        return CRITICAL
+    if request.method == 'GET' and not request.headers.get('Authorization'):
+        return SHEDDABLE
+    return NORMAL
+
+init_admission(app, priority_of=request_priority)
+
+def relay_response(upstream):
+    """Pass a backend response through as-is (body bytes, status, caching headers) without re-serializing"""
+    response = Response(upstream.content, status=upstream.status_code, mimetype='application/json')
+    for header in ('ETag', 'Cache-Control', 'Idempotent-Replayed'):
+        if upstream.headers.get(header):
+            response.headers[header] = upstream.headers[header]
+    return response
+
+def conditional_headers():
+    """Forward the client's If-None-Match so the backend can answer 304"""
+    if request.headers.get('If-None-Match'):
+        return {'If-None-Match': request.headers['If-None-Match']}
+    return {}
+
+def cached_catalog_get(client, path):
+    """Serve a public catalog GET from catalog_cache, proxying to the backend on a miss"""
+    def load():
+        upstream = client.get(path)
+        if upstream.status_code != 200:
+            return relay_response(upstream)
+        return upstream.content, upstream.headers.get('ETag')
+    return serve_cached_catalog(load)
+
+def serve_cached_catalog(load):
+    """
+    Serve request.path from catalog_cache; on a miss load() returns (body bytes, ETag or None),
+    or a Response that is returned uncached (backend errors).
+    Cached entries keep body bytes and ETag, so hits answer If-None-Match with 304.
+    """
+    key = request.path
+    cached = catalog_cache.get(key)
+    cache_status = 'HIT'
+    if cached is None:
+        cache_status = 'MISS'
+        generation = catalog_cache.generation
+        result = load()
+        if isinstance(result, Response):
+            return result
+        body, etag = result
+        cached = (body, etag or quote_etag(generate_etag(body)))
+        catalog_cache.set(key, cached, generation=generation)
+
+    body, etag = cached
+    response = Response(body, status=200, mimetype='application/json')
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Cache'] = cache_status
+    return response.make_conditional(request)
+
+def invalidate_menu_cache():
+    """Drop cached menu lists, single menu items, per-restaurant menus and the storefront"""
+    catalog_cache.invalidate_where(
+        lambda key: key.startswith('/api/menus') or key == '/api/storefront'
+        or (key.startswith('/api/restaurants/') and key.endswith('/menus'))
+    )
+
+def invalidate_restaurant_cache(restaurant_id=None):
+    """Drop cached restaurant lists, the given restaurant and the storefront"""
+    keys = ['/api/restaurants', '/api/storefront']
+    if restaurant_id is not None:
+        keys.append(f'/api/restaurants/{restaurant_id}')
+    catalog_cache.invalidate(*keys)
+
+def invalidate_order_validation(customer_ids=(), menu_ids=()):
+    """
+    Tell every Order Service replica to forget cached customer/menu validity after a delete (no ids: forget
+    everything); a replica that misses it still expires the entries after VALIDATION_CACHE_TTL
+    """
+    order_client.broadcast('POST', '/validation-cache/invalidate', json={
+        'customer_ids': list(customer_ids),
+        'menu_ids': list(menu_ids)
+    })
+
+def refresh_menu_catalogs():
+    """
+    Have every Menu Service replica reload its catalog snapshot now; one that misses it
+    picks the change up on its next periodic reload (MENU_CATALOG_REFRESH_SECONDS)
+    """
+    menu_client.broadcast('POST', '/catalog/refresh')
+
+def menu_changed():
+    """
+    After a menu write: bring every Menu Service replica's snapshot up to date (only the one that
+    handled the write has applied it), then drop cached catalog responses. In this order, a read
+    in between cannot re-cache the old snapshot.
+    """
+    if len(menu_client.replicas) > 1:
+        refresh_menu_catalogs()
+    invalidate_menu_cache()
+
+# Concurrent backend calls made by aggregate routes
+fanout_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('GATEWAY_FANOUT_WORKERS', 16)),
+    thread_name_prefix='gateway-fanout'
+)
+
+# POST /api/batch: sub-requests per call, and its own workers so batched routes that fan out
+# themselves (e.g. /api/storefront) never wait on a pool their caller is holding
+BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', 50))
+BATCH_METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+# Streaming routes have no deadline and would be read into gateway memory as one result; a
+# nested batch would hold a batch worker while waiting for others. Matched by endpoint, so
+# encoded paths (/api/%62atch) cannot get around it
+BATCH_EXCLUDED_ENDPOINTS = ('batch', 'stream_orders', 'export_orders')
+batch_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('GATEWAY_BATCH_WORKERS', 16)),
+    thread_name_prefix='gateway-batch'
+)
+
+# Query params the order listing route forwards to Order Service
+ORDER_LIST_PARAMS = ('limit', 'before_id', 'status', 'created_from', 'created_to', 'updated_since')
+
+# Query params the order export route forwards to Order Service
+ORDER_EXPORT_PARAMS = ('format', 'created_from', 'created_to')
+
+# Order creation carries an Idempotency-Key, so a timed out attempt can be retried without a double insert.
+# The read timeout must stay above Order Service's ORDER_VALIDATION_TIMEOUT
+ORDER_CREATE_TIMEOUT = float(os.getenv('ORDER_CREATE_TIMEOUT', 6))
+ORDER_CREATE_ATTEMPTS = int(os.getenv('ORDER_CREATE_ATTEMPTS', 3))
+ORDER_CREATE_RETRY_BACKOFF = float(os.getenv('ORDER_CREATE_RETRY_BACKOFF', 0.2))
+
+# Order Service sends a heartbeat every SSE_HEARTBEAT_INTERVAL seconds; give up on a silent stream after this
+ORDER_STREAM_READ_TIMEOUT = float(os.getenv('ORDER_STREAM_READ_TIMEOUT', 60))
+
+# An export's first rows can take long (sort of the whole history); wait this long instead of resending,
+# since every attempt would start another full export query holding a pooled connection
+ORDER_EXPORT_READ_TIMEOUT = float(os.getenv('ORDER_EXPORT_READ_TIMEOUT', 300))
+
 # Hardcoded credentials for demo (in production, validate against database)
 USERS = {
     'customer': {'password': 'iamcustomer', 'role': 'customer'},
@@ -96,14 +319,14 @@ def get_customers():
     if claims['role'] != 'admin':
         return jsonify({'error': 'Unauthorized'}), 403
 
-    response = requests.get(f'{CUSTOMER_SERVICE_URL}/customers')
-    return response.json(), response.status_code
+    response = customer_client.get('/customers', headers=conditional_headers())
+    return relay_response(response)
 
 @app.route('/api/customers/<int:customer_id>', methods=['GET'])
 @jwt_required()
 def get_customer(customer_id):
     """Get specific customer"""
-    response = requests.get(f'{CUSTOMER_SERVICE_URL}/customers/{customer_id}')
+    response = customer_client.get(f'/customers/{customer_id}')
     return response.json(), response.status_code
 
 @app.route('/api/customers', methods=['POST'])
@@ -114,7 +337,7 @@ def create_customer():
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
-        response = requests.post(f'{CUSTOMER_SERVICE_URL}/customers', json=data, timeout=10)
+        response = customer_client.post('/customers', json=data)
         
         try:
             return response.json(), response.status_code
@@ -127,6 +350,9 @@ def create_customer():
         return jsonify({'error': 'Cannot connect to Customer Service. Please check if it is running on port 5001'}), 503
     except requests.exceptions.Timeout:
         return jsonify({'error': 'Customer Service request timeout'}), 504
+    except (DeadlineExceeded, OverloadedError):
+        # Answered with 504 / 429 / 503 by their error handlers
+        raise
     except Exception as e:
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
@@ -135,7 +361,7 @@ def create_customer():
 def update_customer(customer_id):
     """Update customer"""
     data = request.get_json()
-    response = requests.put(f'{CUSTOMER_SERVICE_URL}/customers/{customer_id}', json=data)
+    response = customer_client.put(f'/customers/{customer_id}', json=data)
     return response.json(), response.status_code
 
 @app.route('/api/customers/<int:customer_id>', methods=['DELETE'])
@@ -146,7 +372,14 @@ def delete_customer(customer_id):
     if claims['role'] != 'admin':
         return jsonify({'error': 'Unauthorized'}), 403
 
-    response = requests.delete(f'{CUSTOMER_SERVICE_URL}/customers/{customer_id}')
+    # Deleting the customer cascades to their orders; delete those through Order Service first so
+    # delta sync gets tombstones and order stream subscribers get order_deleted events
+    orders_response = order_client.delete('/orders', params={'customer_id': customer_id})
+    if orders_response.status_code != 200:
+        return relay_response(orders_response)
+
+    response = customer_client.delete(f'/customers/{customer_id}')
+    invalidate_order_validation(customer_ids=[customer_id])
     return response.json(), response.status_code
 
 # ==================== RESTAURANT SERVICE ROUTES ====================
@@ -154,14 +387,12 @@ def delete_customer(customer_id):
 @app.route('/api/restaurants', methods=['GET'])
 def get_restaurants():
     """Get all restaurants"""
-    response = requests.get(f'{RESTAURANT_SERVICE_URL}/restaurants')
-    return response.json(), response.status_code
+    return cached_catalog_get(restaurant_client, '/restaurants')
 
 @app.route('/api/restaurants/<int:restaurant_id>', methods=['GET'])
 def get_restaurant(restaurant_id):
     """Get specific restaurant"""
-    response = requests.get(f'{RESTAURANT_SERVICE_URL}/restaurants/{restaurant_id}')
-    return response.json(), response.status_code
+    return cached_catalog_get(restaurant_client, f'/restaurants/{restaurant_id}')
 
 @app.route('/api/restaurants', methods=['POST'])
 @jwt_required()
@@ -172,7 +403,8 @@ def create_restaurant():
         return jsonify({'error': 'Unauthorized'}), 403
 
     data = request.get_json()
-    response = requests.post(f'{RESTAURANT_SERVICE_URL}/restaurants', json=data)
+    response = restaurant_client.post('/restaurants', json=data)
+    invalidate_restaurant_cache()
     return response.json(), response.status_code
 
 @app.route('/api/restaurants/<int:restaurant_id>', methods=['PUT'])
@@ -184,7 +416,8 @@ def update_restaurant(restaurant_id):
         return jsonify({'error': 'Unauthorized'}), 403
 
     data = request.get_json()
-    response = requests.put(f'{RESTAURANT_SERVICE_URL}/restaurants/{restaurant_id}', json=data)
+    response = restaurant_client.put(f'/restaurants/{restaurant_id}', json=data)
+    invalidate_restaurant_cache(restaurant_id)
     return response.json(), response.status_code
 
 @app.route('/api/restaurants/<int:restaurant_id>', methods=['DELETE'])
@@ -195,28 +428,42 @@ def delete_restaurant(restaurant_id):
     if claims['role'] != 'admin':
         return jsonify({'error': 'Unauthorized'}), 403
 
-    response = requests.delete(f'{RESTAURANT_SERVICE_URL}/restaurants/{restaurant_id}')
+    response = restaurant_client.delete(f'/restaurants/{restaurant_id}')
+    # Deleting a restaurant cascades to its menu items; have Menu Service reload its catalog snapshot
+    refresh_menu_catalogs()
+    invalidate_restaurant_cache(restaurant_id)
+    invalidate_menu_cache()
+    invalidate_order_validation()
     return response.json(), response.status_code
 
 # ==================== MENU SERVICE ROUTES ====================
 
+def menu_delta_get(path):
+    """
+    Proxy a ?since_version= delta request to Menu Service (deltas differ per caller, so they are not cached);
+    every replica counts its own catalog versions, so deltas always come from the primary replica
+    """
+    response = menu_client.get(path, params={'since_version': request.args['since_version']}, primary=True)
+    return relay_response(response)
+
 @app.route('/api/menus', methods=['GET'])
 def get_menus():
-    """Get all menu items"""
-    response = requests.get(f'{MENU_SERVICE_URL}/menus')
-    return response.json(), response.status_code
+    """Get all menu items, or only changes since a catalog version with ?since_version="""
+    if 'since_version' in request.args:
+        return menu_delta_get('/menus')
+    return cached_catalog_get(menu_client, '/menus')
 
 @app.route('/api/menus/<int:menu_id>', methods=['GET'])
 def get_menu(menu_id):
     """Get specific menu item"""
-    response = requests.get(f'{MENU_SERVICE_URL}/menus/{menu_id}')
-    return response.json(), response.status_code
+    return cached_catalog_get(menu_client, f'/menus/{menu_id}')
 
 @app.route('/api/restaurants/<int:restaurant_id>/menus', methods=['GET'])
 def get_restaurant_menus(restaurant_id):
-    """Get menu items for specific restaurant"""
-    response = requests.get(f'{MENU_SERVICE_URL}/restaurants/{restaurant_id}/menus')
-    return response.json(), response.status_code
+    """Get menu items for specific restaurant (supports ?since_version= like GET /api/menus)"""
+    if 'since_version' in request.args:
+        return menu_delta_get(f'/restaurants/{restaurant_id}/menus')
+    return cached_catalog_get(menu_client, f'/restaurants/{restaurant_id}/menus')
 
 @app.route('/api/menus', methods=['POST'])
 @jwt_required()
@@ -227,7 +474,8 @@ def create_menu():
         return jsonify({'error': 'Unauthorized'}), 403
 
     data = request.get_json()
-    response = requests.post(f'{MENU_SERVICE_URL}/menus', json=data)
+    response = menu_client.post('/menus', json=data)
+    menu_changed()
     return response.json(), response.status_code
 
 @app.route('/api/menus/<int:menu_id>', methods=['PUT'])
@@ -239,7 +487,8 @@ def update_menu(menu_id):
         return jsonify({'error': 'Unauthorized'}), 403
 
     data = request.get_json()
-    response = requests.put(f'{MENU_SERVICE_URL}/menus/{menu_id}', json=data)
+    response = menu_client.put(f'/menus/{menu_id}', json=data)
+    menu_changed()
     return response.json(), response.status_code
 
 @app.route('/api/menus/<int:menu_id>', methods=['DELETE'])
@@ -250,24 +499,172 @@ def delete_menu(menu_id):
     if claims['role'] != 'admin':
         return jsonify({'error': 'Unauthorized'}), 403
 
-    response = requests.delete(f'{MENU_SERVICE_URL}/menus/{menu_id}')
+    response = menu_client.delete(f'/menus/{menu_id}')
+    menu_changed()
+    invalidate_order_validation(menu_ids=[menu_id])
     return response.json(), response.status_code
 
+# ==================== STOREFRONT ====================
+
+def load_storefront():
+    """Fetch restaurants and menus concurrently and nest each restaurant's menus"""
+    restaurants_future = submit_in_context(fanout_executor, restaurant_client.get, '/restaurants')
+    menus_future = submit_in_context(fanout_executor, menu_client.get, '/menus')
+    try:
+        restaurants_response = restaurants_future.result()
+        menus_response = menus_future.result()
+    except requests.exceptions.RequestException:
+        response = jsonify({'error': 'Cannot connect to Restaurant/Menu Service'})
+        response.status_code = 503
+        return response
+
+    for upstream in (restaurants_response, menus_response):
+        if upstream.status_code != 200:
+            return relay_response(upstream)
+
+    menus_by_restaurant = {}
+    for menu in menus_response.json():
+        menus_by_restaurant.setdefault(menu['restaurant_id'], []).append(menu)
+
+    storefront = [
+        dict(restaurant, menus=menus_by_restaurant.get(restaurant['id'], []))
+        for restaurant in restaurants_response.json()
+    ]
+    return jsonify(storefront).get_data(), None
+
+@app.route('/api/storefront', methods=['GET'])
+def get_storefront():
+    """Get all restaurants with their menu items nested, in one call (cached as one unit)"""
+    return serve_cached_catalog(load_storefront)
+
 # ==================== ORDER SERVICE ROUTES ====================
 
 @app.route('/api/orders', methods=['GET'])
 @jwt_required()
 def get_orders():
-    """Get all orders (Admin) or user's orders (Customer)"""
+    """
+    Get all orders (Admin) or user's orders (Customer)
+    Passes through pagination/filter params: limit, before_id, status, created_from, created_to,
+    and updated_since for delta sync
+    """
     claims = get_jwt()
-    response = requests.get(f'{ORDER_SERVICE_URL}/orders', params={'role': claims['role'], 'username': claims['sub']})
-    return response.json(), response.status_code
+    params = {key: request.args[key] for key in ORDER_LIST_PARAMS if key in request.args}
+    # Role and username always come from the token, never from the query string
+    params.update({'role': claims['role'], 'username': claims['sub']})
+    response = order_client.get('/orders', params=params, headers=conditional_headers())
+    return relay_response(response)
+
+@app.route('/api/orders/stream', methods=['GET'])
+@without_deadline
+@jwt_required(locations=['headers', 'query_string'])
+def stream_orders():
+    """
+    Server-Sent Events stream of order changes, replaces polling GET /api/orders
+    Admin receives all orders, Customer only their own. Token via Authorization header or ?token=
+    """
+    claims = get_jwt()
+    headers = {}
+    if request.headers.get('Last-Event-ID'):
+        headers['Last-Event-ID'] = request.headers['Last-Event-ID']
+
+    try:
+        upstream = order_client.get(
+            '/orders/events',
+            params={'role': claims['role'], 'username': claims['sub']},
+            headers=headers,
+            stream=True,
+            timeout=(order_client.connect_timeout, ORDER_STREAM_READ_TIMEOUT)
+        )
+    except requests.exceptions.RequestException:
+        return jsonify({'error': 'Cannot connect to Order Service. Please check if it is running on port 5004'}), 503
+
+    if upstream.status_code != 200:
+        upstream.close()
+        return jsonify({'error': f'Order Service returned {upstream.status_code}'}), upstream.status_code
+
+    def generate():
+        try:
+            for chunk in upstream.iter_content(chunk_size=None):
+                yield chunk
+        except requests.exceptions.RequestException:
+            # Upstream went away; the browser reconnects with Last-Event-ID
+            pass
+        finally:
+            upstream.close()
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/orders/export', methods=['GET'])
+@without_deadline
+@jwt_required()
+def export_orders():
+    """
+    Stream the full order history with items as NDJSON or CSV (Admin only)
+    Query params: format=ndjson|csv, created_from, created_to
+    """
+    claims = get_jwt()
+    if claims['role'] != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    params = {key: request.args[key] for key in ORDER_EXPORT_PARAMS if key in request.args}
+    try:
+        upstream = order_client.get(
+            '/orders/export',
+            params=params,
+            stream=True,
+            retries=0,
+            timeout=(order_client.connect_timeout, ORDER_EXPORT_READ_TIMEOUT)
+        )
+    except requests.exceptions.RequestException:
+        return jsonify({'error': 'Cannot connect to Order Service. Please check if it is running on port 5004'}), 503
+
+    if upstream.status_code != 200:
+        response = relay_response(upstream)
+        upstream.close()
+        return response
+
+    def generate():
+        try:
+            for chunk in upstream.iter_content(chunk_size=None):
+                yield chunk
+        finally:
+            upstream.close()
+
+    return Response(stream_with_context(generate()), content_type=upstream.headers.get('Content-Type'), headers={
+        'Content-Disposition': upstream.headers.get('Content-Disposition', 'attachment'),
+        'X-Accel-Buffering': 'no'
+    })
+
+def post_order(data):
+    """
+    POST an order to Order Service under an Idempotency-Key (the client's, or one generated here),
+    retrying connection errors and timeouts with the same key; a retry of an order that was already
+    written gets the original order back instead of a second one
+    """
+    headers = {'Idempotency-Key': request.headers.get('Idempotency-Key') or str(uuid.uuid4())}
+    for attempt in range(ORDER_CREATE_ATTEMPTS):
+        try:
+            return order_client.post(
+                '/orders',
+                json=data,
+                headers=headers,
+                timeout=(order_client.connect_timeout, ORDER_CREATE_TIMEOUT)
+            )
+        except CircuitOpenError:
+            raise
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt == ORDER_CREATE_ATTEMPTS - 1:
+                raise
+            time.sleep(ORDER_CREATE_RETRY_BACKOFF * (2 ** attempt))
 
 @app.route('/api/orders/<int:order_id>', methods=['GET'])
 @jwt_required()
 def get_order(order_id):
     """Get specific order"""
-    response = requests.get(f'{ORDER_SERVICE_URL}/orders/{order_id}')
+    response = order_client.get(f'/orders/{order_id}')
     return response.json(), response.status_code
 
 @app.route('/api/orders', methods=['POST'])
@@ -285,10 +682,13 @@ def create_order():
             data['username'] = get_jwt_identity()
         # If username is provided in body, use it (allows admin to specify customer username)
         
-        response = requests.post(f'{ORDER_SERVICE_URL}/orders', json=data, timeout=10)
+        response = post_order(data)
         
         try:
-            return response.json(), response.status_code
+            headers = {}
+            if response.headers.get('Idempotent-Replayed'):
+                headers['Idempotent-Replayed'] = response.headers['Idempotent-Replayed']
+            return response.json(), response.status_code, headers
         except ValueError:
             # If response is not JSON
             return jsonify({
@@ -299,9 +699,38 @@ def create_order():
         return jsonify({'error': 'Cannot connect to Order Service. Please check if it is running on port 5004'}), 503
     except requests.exceptions.Timeout:
         return jsonify({'error': 'Order Service request timeout'}), 504
+    except (DeadlineExceeded, OverloadedError):
+        # Answered with 504 / 429 / 503 by their error handlers
+        raise
     except Exception as e:
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
+@app.route('/api/checkout', methods=['POST'])
+@jwt_required()
+def checkout():
+    """
+    Place an order in one round trip: the customer is looked up by email (or created) and the order written
+    Expected JSON: the POST /api/orders body with customer_name, customer_email, customer_phone instead of customer_id
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        if not data.get('customer_email'):
+            return jsonify({'error': 'customer_email is required'}), 400
+
+        if not data.get('username'):
+            data['username'] = get_jwt_identity()
+        # Order Service resolves the customer by email while it validates the menu items
+        data.pop('customer_id', None)
+
+        response = post_order(data)
+        return relay_response(response)
+    except requests.exceptions.ConnectionError:
+        return jsonify({'error': 'Cannot connect to Order Service. Please check if it is running on port 5004'}), 503
+    except requests.exceptions.Timeout:
+        return jsonify({'error': 'Order Service request timeout'}), 504
+
 @app.route('/api/orders/<int:order_id>', methods=['PUT'])
 @jwt_required()
 def update_order(order_id):
@@ -311,7 +740,7 @@ def update_order(order_id):
         return jsonify({'error': 'Unauthorized'}), 403
 
     data = request.get_json()
-    response = requests.put(f'{ORDER_SERVICE_URL}/orders/{order_id}', json=data)
+    response = order_client.put(f'/orders/{order_id}', json=data)
     return response.json(), response.status_code
 
 @app.route('/api/orders/<int:order_id>', methods=['DELETE'])
@@ -322,7 +751,7 @@ def delete_order(order_id):
     if claims['role'] != 'admin':
         return jsonify({'error': 'Unauthorized'}), 403
 
-    response = requests.delete(f'{ORDER_SERVICE_URL}/orders/{order_id}')
+    response = order_client.delete(f'/orders/{order_id}')
     return response.json(), response.status_code
 
 @app.route('/api/orders/<int:order_id>/status', methods=['PATCH'])
@@ -334,14 +763,114 @@ def update_order_status(order_id):
         return jsonify({'error': 'Unauthorized'}), 403
 
     data = request.get_json()
-    response = requests.patch(f'{ORDER_SERVICE_URL}/orders/{order_id}/status', json=data)
+    response = order_client.patch(f'/orders/{order_id}/status', json=data)
+    return response.json(), response.status_code
+
+@app.route('/api/orders/status', methods=['PATCH'])
+@jwt_required()
+def update_order_statuses():
+    """
+    Update the status of many orders at once (Admin only)
+    Expected JSON: { "ids": [1, 2, 3], "status": "on_delivery" }
+    """
+    claims = get_jwt()
+    if claims['role'] != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    data = request.get_json()
+    response = order_client.patch('/orders/status', json=data)
     return response.json(), response.status_code
 
+# ==================== BATCH ====================
+
+def validate_batch_item(item):
+    """Return an error message for a malformed sub-request, or None"""
+    if not isinstance(item, dict):
+        return 'Each request must be an object with method and path'
+    method = str(item.get('method', '')).upper()
+    if method not in BATCH_METHODS:
+        return f"method must be one of {', '.join(BATCH_METHODS)}"
+    path = item.get('path')
+    if not isinstance(path, str) or not path.startswith('/api/'):
+        return 'path must start with /api/'
+    route = unquote(urlsplit(path).path)
+    try:
+        endpoint, _ = app.url_map.bind('localhost').match(route, method=method)
+    except HTTPException:
+        # Unknown route or method: the dispatch answers it with its own 404/405
+        return None
+    if endpoint in BATCH_EXCLUDED_ENDPOINTS:
+        return f'{route} cannot be used inside a batch'
+    return None
+
+def run_batch_item(item, headers):
+    """
+    Dispatch one sub-request through the gateway's own routes, so it gets exactly the
+    auth checks, cache handling and invalidation of the individual handler
+    """
+    method = item['method'].upper()
+    kwargs = {'method': method, 'headers': headers}
+    if item.get('body') is not None:
+        kwargs['json'] = item['body']
+
+    with app.test_request_context(item['path'], **kwargs):
+        try:
+            response = app.full_dispatch_request()
+        except requests.exceptions.ConnectionError:
+            return {'status': 503, 'body': {'error': 'Cannot connect to backend service'}}
+        except requests.exceptions.Timeout:
+            return {'status': 504, 'body': {'error': 'Backend service request timeout'}}
+        except Exception as e:
+            return {'status': 500, 'body': {'error': f'Internal server error: {str(e)}'}}
+
+        body = response.get_json(silent=True)
+        if body is None and response.status_code >= 400:
+            # Flask's own errors (404, 405) are HTML pages
+            body = {'error': response.status}
+        return {'status': response.status_code, 'body': body}
+
+@app.route('/api/batch', methods=['POST'])
+def batch():
+    """
+    Run several API calls in one round trip
+    Expected JSON: { "requests": [{ "method": "PATCH", "path": "/api/orders/7/status", "body": {...} }, ...] }
+    Sub-requests run concurrently with the caller's Authorization header, so they must not depend
+    on each other. Returns one { "status", "body" } result per sub-request, in request order.
+    """
+    data = request.get_json(silent=True)
+    items = data.get('requests') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'requests must be a non-empty list'}), 400
+    if len(items) > BATCH_MAX_REQUESTS:
+        return jsonify({'error': f'Too many requests in batch (max {BATCH_MAX_REQUESTS})'}), 400
+
+    for index, item in enumerate(items):
+        error = validate_batch_item(item)
+        if error:
+            return jsonify({'error': f'requests[{index}]: {error}'}), 400
+
+    headers = {}
+    if request.headers.get('Authorization'):
+        headers['Authorization'] = request.headers['Authorization']
+    # Sub-requests share the batch's request id, hang off its handler span and get what is left of its budget
+    headers = budget_headers(outgoing_headers(headers))
+
+    # Plain submit, not submit_in_context: each sub-request pushes its own app and request context,
+    # and the trace/deadline/admission hooks must not share (and reset) the batch request's context
+    futures = [batch_executor.submit(run_batch_item, item, headers) for item in items]
+    return jsonify({'results': [future.result() for future in futures]}), 200
+
 # Health check
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({'status': 'API Gateway is running'}), 200
+    return jsonify({
+        'status': 'API Gateway is running',
+        'catalog_cache': catalog_cache.stats(),
+        'circuit_breakers': {client.name: client.breaker.stats() for client in backend_clients},
+        'admission': {client.name: client.limiter.stats() for client in backend_clients if client.limiter is not None},
+        'replicas': {client.name: client.replicas.stats() for client in backend_clients}
+    }), 200
 
 if __name__ == '__main__':
     port = int(os.getenv('API_GATEWAY_PORT', 5000))
@@ -0,0 +1,155 @@
+"""
+Benchmark: order write path, per-row item INSERTs vs one multi-row INSERT in a transaction
+
+Compares the old create_order write path (one INSERT per order line) with
+order_service's insert_order (single executemany batch inside one explicit
+transaction) for orders with 1, 10 and 50 line items, and prints orders/sec.
+
+Round trips per order (client <-> MySQL), which is what the change removes:
+
+    items   per-row (INSERT order, N x INSERT item, COMMIT)   batched tx (START, INSERT order, 1 multi-row INSERT, COMMIT)
+        1                                                3                                                             4
+       10                                               12                                                             4
+       50                                               52                                                             4
+
+With one round trip costing far more than the row work itself, orders/sec should track these
+counts: about even at 1 item, and the batched path several times faster at 10 and 50 items.
+Measured orders/sec have not been recorded yet; run this script against a MySQL server and
+add its table here.
+
+Needs the MySQL database from backend/.env with at least one customer and one
+menu item (run init_db.py first). Every order written here uses the username
+"__benchmark__" and is deleted again at the end.
+
+Usage:
+    cd backend
+    python benchmarks/bench_order_writes.py [--orders 200] [--sizes 1,10,50]
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND_DIR)
+from common.db import ConnectionPool, load_db_config
+
+load_dotenv(os.path.join(BACKEND_DIR, '.env'))
+
+BENCHMARK_USERNAME = '__benchmark__'
+
+
+def load_order_service():
+    """Import order_service/app.py as a module to benchmark its real write path"""
+    path = os.path.join(BACKEND_DIR, 'services', 'order_service', 'app.py')
+    spec = importlib.util.spec_from_file_location('order_service_app', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def insert_order_per_row(conn, customer_id, data, items):
+    """Write path before the change: one INSERT per order line, implicit transaction"""
+    cursor = conn.cursor()
+    cursor.execute(
+        '''INSERT INTO orders
+           (customer_id, customer_username, customer_name, customer_email,
+            customer_phone, delivery_address, payment_method, total_price, tax, status)
+           VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)''',
+        (customer_id, data['username'], data['customer_name'], data['customer_email'],
+         data['customer_phone'], data['delivery_address'], data['payment_method'],
+         data['total_price'], data['tax'], 'on_process')
+    )
+    order_id = cursor.lastrowid
+    for item in items:
+        cursor.execute(
+            'INSERT INTO order_items (order_id, menu_id, quantity, price) VALUES (%s, %s, %s, %s)',
+            (order_id, item['menu_id'], item['quantity'], item['price'])
+        )
+    conn.commit()
+    cursor.close()
+    return order_id
+
+
+def load_fixtures(pool):
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT id FROM customers ORDER BY id LIMIT 1')
+        customer = cursor.fetchone()
+        cursor.execute('SELECT id, price FROM menu_items ORDER BY id')
+        menus = cursor.fetchall()
+        cursor.close()
+    if not customer or not menus:
+        sys.exit('Benchmark needs at least one customer and one menu item (run init_db.py first)')
+    return customer[0], menus
+
+
+def build_order(menus, size):
+    items = [
+        {'menu_id': menus[i % len(menus)][0], 'quantity': 1, 'price': menus[i % len(menus)][1]}
+        for i in range(size)
+    ]
+    subtotal = sum(item['price'] for item in items)
+    data = {
+        'username': BENCHMARK_USERNAME,
+        'customer_name': 'Benchmark',
+        'customer_email': 'benchmark@example.com',
+        'customer_phone': '000000000000',
+        'delivery_address': 'Benchmark',
+        'payment_method': 'cash',
+        'total_price': int(subtotal * 1.05),
+        'tax': int(subtotal * 0.05)
+    }
+    return data, items
+
+
+def run(pool, write, customer_id, data, items, orders):
+    with pool.connection() as conn:
+        started = time.perf_counter()
+        for _ in range(orders):
+            write(conn, customer_id, data, items)
+        elapsed = time.perf_counter() - started
+    return orders / elapsed
+
+
+def cleanup(pool):
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            'DELETE oi FROM order_items oi JOIN orders o ON oi.order_id = o.id WHERE o.customer_username = %s',
+            (BENCHMARK_USERNAME,)
+        )
+        cursor.execute('DELETE FROM orders WHERE customer_username = %s', (BENCHMARK_USERNAME,))
+        conn.commit()
+        cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=200, help='orders written per strategy and size')
+    parser.add_argument('--sizes', default='1,10,50', help='comma separated line item counts')
+    args = parser.parse_args()
+
+    order_service = load_order_service()
+    pool = ConnectionPool(load_db_config(), size=1, name='benchmark')
+    customer_id, menus = load_fixtures(pool)
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    print(f'{args.orders} orders per run\n')
+    print(f'{"items":>6} | {"per-row (orders/s)":>19} | {"batched tx (orders/s)":>22} | {"speedup":>7}')
+    print('-' * 65)
+    try:
+        for size in sizes:
+            data, items = build_order(menus, size)
+            before = run(pool, insert_order_per_row, customer_id, data, items, args.orders)
+            after = run(pool, order_service.insert_order, customer_id, data, items, args.orders)
+            print(f'{size:>6} | {before:>19.1f} | {after:>22.1f} | {after / before:>6.2f}x')
+    finally:
+        cleanup(pool)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+"""
+Load test: API Gateway admission control (adaptive concurrency limits, load shedding) under overload
+
+Starts a simulated Menu/Order Service whose capacity is fixed (--workers concurrent requests
+per service, --service-ms each, anything beyond that queues), then the real API Gateway in
+front of it, first with ADMISSION_CONTROL=off and then on. Each run offers an open-loop load
+of 1x and --overload times the backends' capacity:
+
+    50%  GET  /api/menus/<id>   anonymous catalog browsing   (sheddable, Menu Service)
+    30%  GET  /api/orders       authenticated order listing  (normal, Order Service)
+    20%  POST /api/orders       order creation               (critical, Order Service)
+
+and prints per class how many requests succeeded or were shed (429/503) and their latency.
+Latency is measured from the scheduled send time, so client-side queueing is included.
+Without admission control the overloaded backends queue without bound and p99 runs into the
+gateway's request budget; with it, excess requests are refused within milliseconds and the
+admitted ones keep close to the backend's own latency.
+
+No database is needed. The catalog cache is disabled (CATALOG_CACHE_TTL=0) so every catalog
+request reaches Menu Service.
+
+Usage:
+    cd backend
+    python benchmarks/load_gateway_admission.py [--duration 10] [--overload 3] [--workers 2] [--service-ms 100]
+
+The load generator, gateway and simulated services share the machine; keep the offered rate
+(2 * workers / service time * overload) well below what the gateway can serve on the CPU
+itself, otherwise the test measures the gateway's CPU instead of backend queueing.
+"""
+import argparse
+import importlib.util
+import logging
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND_DIR)
+
+GATEWAY_PORT = 5950
+SIMULATED_BACKEND_PORT = 5951
+
+# (share of arrivals, class, method, path)
+TRAFFIC_MIX = (
+    (0.5, 'sheddable', 'GET', '/api/menus/{menu_id}'),
+    (0.3, 'normal', 'GET', '/api/orders'),
+    (0.2, 'critical', 'POST', '/api/orders')
+)
+
+ORDER_BODY = {
+    'customer_id': 1,
+    'items': [{'menu_id': 1, 'quantity': 1, 'price': 25000}],
+    'total_price': 25000,
+    'tax': 2500,
+    'delivery_address': 'Jl. Benchmark 1',
+    'payment_method': 'cash'
+}
+
+
+def serve_simulated_backend(port, workers, service_time):
+    """Menu and Order Service stand-ins that handle `workers` requests at a time each"""
+    from flask import Flask, jsonify
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    app = Flask('simulated_backend')
+    capacity = {'menu_service': threading.Semaphore(workers), 'order_service': threading.Semaphore(workers)}
+
+    def work(service):
+        with capacity[service]:
+            time.sleep(service_time)
+
+    @app.route('/menus/<int:menu_id>', methods=['GET'])
+    def get_menu(menu_id):
+        work('menu_service')
+        return jsonify({'id': menu_id, 'name': 'Croissant', 'price': 25000})
+
+    @app.route('/orders', methods=['GET'])
+    def get_orders():
+        work('order_service')
+        return jsonify([])
+
+    @app.route('/orders', methods=['POST'])
+    def create_order():
+        work('order_service')
+        return jsonify({'message': 'Order created successfully', 'order_id': 1, 'customer_id': 1}), 201
+
+    @app.route('/health', methods=['GET'])
+    def health():
+        return jsonify({'status': 'ok'})
+
+    make_server('127.0.0.1', port, app, threaded=True).serve_forever()
+
+
+def serve_gateway(port):
+    """Run api_gateway/app.py on a threaded server (environment prepared by start_gateway)"""
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    path = os.path.join(BACKEND_DIR, 'api_gateway', 'app.py')
+    spec = importlib.util.spec_from_file_location('api_gateway_app', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    make_server('127.0.0.1', port, module.app, threaded=True).serve_forever()
+
+
+def start_process(args, env=None):
+    return subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__)] + args,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+
+
+def wait_until_up(url, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f'{url} did not come up')
+
+
+def start_gateway(admission):
+    backend_url = f'http://127.0.0.1:{SIMULATED_BACKEND_PORT}'
+    env = dict(os.environ)
+    env.update({
+        'MENU_SERVICE_URL': backend_url,
+        'ORDER_SERVICE_URL': backend_url,
+        'CUSTOMER_SERVICE_URL': backend_url,
+        'RESTAURANT_SERVICE_URL': backend_url,
+        'CATALOG_CACHE_TTL': '0',
+        'TRACE_EXPORT': 'none',
+        'ADMISSION_CONTROL': 'on' if admission else 'off',
+        # Keep the breaker out of the way; this run is about queueing, not failures
+        'CIRCUIT_FAILURE_THRESHOLD': '1000000'
+    })
+    process = start_process(['--serve-gateway'], env)
+    wait_until_up(f'http://127.0.0.1:{GATEWAY_PORT}/api/health')
+    return process
+
+
+def login(base_url):
+    response = requests.post(f'{base_url}/api/login', json={'username': 'customer', 'password': 'iamcustomer'})
+    response.raise_for_status()
+    return response.json()['access_token']
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def run_load(base_url, token, rate, duration):
+    """Open-loop load: requests are sent on schedule whether or not earlier ones have finished"""
+    local = threading.local()
+    results = []
+    results_lock = threading.Lock()
+    rng = random.Random(42)
+    auth = {'Authorization': f'Bearer {token}'}
+
+    def send(traffic_class, method, path, scheduled):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        kwargs = {'timeout': 30}
+        if traffic_class != 'sheddable':
+            kwargs['headers'] = auth
+        if method == 'POST':
+            kwargs['json'] = ORDER_BODY
+        try:
+            status = session.request(method, base_url + path, **kwargs).status_code
+        except requests.exceptions.RequestException:
+            status = 'error'
+        with results_lock:
+            results.append((traffic_class, status, time.perf_counter() - scheduled))
+
+    executor = ThreadPoolExecutor(max_workers=2000)
+    started = time.perf_counter()
+    total = int(rate * duration)
+    for index in range(total):
+        scheduled = started + index / rate
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        pick = rng.random()
+        for share, traffic_class, method, path in TRAFFIC_MIX:
+            if pick < share:
+                break
+            pick -= share
+        executor.submit(send, traffic_class, method, path.format(menu_id=rng.randint(1, 50)), scheduled)
+    executor.shutdown(wait=True)
+    return results
+
+
+def report(label, results):
+    print(f'\n{label}')
+    print(f"  {'class':<10} {'sent':>6} {'ok':>6} {'shed':>6} {'other':>6} {'p50 ms':>9} {'p99 ms':>9} {'ok p99 ms':>10}")
+    for _, traffic_class, _, _ in TRAFFIC_MIX + ((None, 'all', None, None),):
+        rows = [row for row in results if traffic_class in ('all', row[0])]
+        latencies = [row[2] * 1000 for row in rows]
+        ok_latencies = [row[2] * 1000 for row in rows if isinstance(row[1], int) and row[1] < 400]
+        shed = sum(1 for row in rows if row[1] in (429, 503))
+        print(
+            f'  {traffic_class:<10} {len(rows):>6} {len(ok_latencies):>6} {shed:>6} '
+            f'{len(rows) - len(ok_latencies) - shed:>6} {percentile(latencies, 50):>9.1f} '
+            f'{percentile(latencies, 99):>9.1f} {percentile(ok_latencies, 99):>10.1f}'
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=10, help='seconds per load level')
+    parser.add_argument('--overload', type=float, default=3, help='overload factor of the second load level')
+    parser.add_argument('--workers', type=int, default=2, help='concurrent requests each simulated service handles')
+    parser.add_argument('--service-ms', type=float, default=100, help='time each simulated request takes')
+    parser.add_argument('--serve-gateway', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--serve-backend', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_gateway:
+        serve_gateway(GATEWAY_PORT)
+        return
+    if args.serve_backend:
+        serve_simulated_backend(SIMULATED_BACKEND_PORT, args.workers, args.service_ms / 1000)
+        return
+
+    # Half of the traffic goes to each simulated service
+    capacity = 2 * args.workers / (args.service_ms / 1000)
+    base_url = f'http://127.0.0.1:{GATEWAY_PORT}'
+    print(f'Simulated capacity: {capacity:.0f} req/s ({args.workers} x {args.service_ms:.0f} ms per service)')
+
+    for admission in (False, True):
+        backend = start_process([
+            '--serve-backend', '--workers', str(args.workers), '--service-ms', str(args.service_ms)
+        ])
+        gateway = None
+        try:
+            wait_until_up(f'http://127.0.0.1:{SIMULATED_BACKEND_PORT}/health')
+            gateway = start_gateway(admission)
+            token = login(base_url)
+            for factor in (1, args.overload):
+                rate = capacity * factor
+                results = run_load(base_url, token, rate, args.duration)
+                report(f"admission={'on' if admission else 'off'}  load={factor:g}x ({rate:.0f} req/s)", results)
+            if admission:
+                health = requests.get(f'{base_url}/api/health', timeout=5).json()
+                for name, stats in health.get('admission', {}).items():
+                    if stats['admitted']:
+                        print(f'  {name}: {stats}')
+        finally:
+            if gateway is not None:
+                gateway.terminate()
+                gateway.wait()
+            backend.terminate()
+            backend.wait()
+
+
+if __name__ == '__main__':
+    main()
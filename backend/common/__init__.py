@@ -0,0 +1 @@
+"""Shared helpers used by the API Gateway and all microservices"""
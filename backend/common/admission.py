@@ -0,0 +1,188 @@
+"""
+Adaptive concurrency limits and prioritized load shedding for backend calls
+
+    menu_client = ServiceClient(MENU_SERVICE_URL, name='menu_service', limiter=AdaptiveLimiter('menu_service'))
+    init_admission(app, priority_of=request_priority)
+
+Each AdaptiveLimiter caps the calls in flight to one backend. The cap follows the backend's
+latency the way TCP Vegas follows round-trip time. Latencies are averaged over windows of
+WINDOW_SAMPLES calls, since one backend mixes fast answers (304s, snapshot lookups) with slow
+ones (queries) and single samples say little. With rtt_noload the lowest window average seen
+recently, limit * (1 - rtt_noload / rtt) estimates how many calls are queued inside the
+backend. Few queued calls grow the limit by log10(limit), many shrink it by the same step,
+and errors/timeouts cut it multiplicatively (AIMD). A backend that slows down therefore gets
+fewer concurrent calls instead of an ever longer queue. While the limit is being cut,
+rtt_noload drifts towards the current average, so a backend that got slower for good (or a
+heavier traffic mix) is not throttled down to min_limit forever.
+
+Streamed calls (SSE, exports) are not limited: they hold a connection for as long as the
+client reads, and their time to first byte is not a latency sample.
+
+Requests are admitted by priority. A priority may only use its share of the limit, so lower
+priorities are shed first and the rest stays free for checkout and admin work:
+
+    critical   100%   order creation, checkout, order status updates
+    normal      90%   other authenticated requests
+    sheddable   70%   anonymous catalog browsing
+
+A request that does not fit fails at once with OverloadedError: 429 for shed normal/sheddable
+traffic, 503 when even critical work does not fit, both with Retry-After.
+
+Configuration (environment variables):
+    ADMISSION_CONTROL           on (default) or off
+    ADMISSION_INITIAL_LIMIT     Starting concurrency limit per backend (default 20)
+    ADMISSION_MIN_LIMIT         Lower bound of the limit (default 4)
+    ADMISSION_MAX_LIMIT         Upper bound of the limit (default 200)
+    ADMISSION_RETRY_AFTER       Retry-After seconds sent with 429/503 (default 1)
+"""
+import contextvars
+import math
+import os
+import threading
+
+from flask import g, jsonify
+
+CRITICAL = 'critical'
+NORMAL = 'normal'
+SHEDDABLE = 'sheddable'
+
+# Share of the concurrency limit each priority may fill
+PRIORITY_SHARES = {CRITICAL: 1.0, NORMAL: 0.9, SHEDDABLE: 0.7}
+
+# Multiplicative decrease after an error or timeout
+DROP_BACKOFF = 0.9
+
+# Calls per latency window; the limit is adjusted once per window
+WINDOW_SAMPLES = 20
+
+# Share of the gap to the window average that rtt_noload drifts up by per shrinking window
+NOLOAD_DRIFT = 0.02
+
+_priority = contextvars.ContextVar('request_priority', default=NORMAL)
+
+
+class OverloadedError(Exception):
+    """Raised instead of calling a backend that has no concurrency left for this request's priority"""
+
+    def __init__(self, name, priority, limit):
+        super().__init__(f'{name} is at its concurrency limit ({limit}) for {priority} requests')
+        self.name = name
+        self.priority = priority
+        self.status = 503 if priority == CRITICAL else 429
+
+
+class AdaptiveLimiter:
+    """Vegas-style adaptive concurrency limit for one backend"""
+
+    def __init__(self, name, initial_limit=None, min_limit=None, max_limit=None):
+        self.name = name
+        self.min_limit = min_limit or int(os.getenv('ADMISSION_MIN_LIMIT', 4))
+        self.max_limit = max_limit or int(os.getenv('ADMISSION_MAX_LIMIT', 200))
+        self._limit = float(initial_limit or int(os.getenv('ADMISSION_INITIAL_LIMIT', 20)))
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._rtt_noload = None
+        self._window_rtt = 0.0
+        self._window_samples = 0
+        self._window_in_flight = 0
+
+        # Statistics
+        self._admitted = 0
+        self._rejected = {priority: 0 for priority in PRIORITY_SHARES}
+
+    def acquire(self, priority=None):
+        """Take a slot for a call, raising OverloadedError when the priority's share of the limit is in use"""
+        priority = priority or _priority.get()
+        with self._lock:
+            if self._in_flight >= max(self._limit * PRIORITY_SHARES[priority], 1):
+                self._rejected[priority] += 1
+                raise OverloadedError(self.name, priority, int(self._limit))
+            self._in_flight += 1
+            self._admitted += 1
+
+    def release(self, rtt=None, dropped=False):
+        """Give the slot back; rtt (seconds) of a successful call or dropped=True adjusts the limit"""
+        with self._lock:
+            in_flight = self._in_flight
+            self._in_flight -= 1
+            if dropped:
+                self._limit = max(self._limit * DROP_BACKOFF, self.min_limit)
+            elif rtt is not None and rtt > 0:
+                self._update(rtt, in_flight)
+
+    def _update(self, rtt, in_flight):
+        self._window_rtt += rtt
+        self._window_samples += 1
+        self._window_in_flight = max(self._window_in_flight, in_flight)
+        if self._window_samples < WINDOW_SAMPLES:
+            return
+        rtt = self._window_rtt / self._window_samples
+        in_flight = self._window_in_flight
+        self._window_rtt = 0.0
+        self._window_samples = 0
+        self._window_in_flight = 0
+
+        if self._rtt_noload is None or rtt < self._rtt_noload:
+            self._rtt_noload = rtt
+            return
+
+        limit = self._limit
+        queued = limit * (1 - self._rtt_noload / rtt)
+        threshold = math.log10(limit)
+        step = max(threshold, 1.0)
+        if queued > 6 * threshold:
+            limit -= step
+            # Latency that does not come down with the limit is the backend's new normal
+            self._rtt_noload += (rtt - self._rtt_noload) * NOLOAD_DRIFT
+        elif queued < 3 * threshold and in_flight * 2 >= limit:
+            # Only grow while the limit is actually being used
+            limit += step
+        self._limit = min(max(limit, self.min_limit), self.max_limit)
+
+    @property
+    def limit(self):
+        with self._lock:
+            return int(self._limit)
+
+    def stats(self):
+        """Snapshot of limiter state for health/metrics endpoints"""
+        with self._lock:
+            stats = {
+                'name': self.name,
+                'limit': int(self._limit),
+                'in_flight': self._in_flight,
+                'rtt_noload_ms': round(self._rtt_noload * 1000, 3) if self._rtt_noload else 0,
+                'admitted': self._admitted
+            }
+            for priority, rejected in self._rejected.items():
+                stats[f'rejected_{priority}'] = rejected
+            return stats
+
+
+def request_limiter(name):
+    """AdaptiveLimiter for a backend client, or None when ADMISSION_CONTROL=off"""
+    enabled = os.getenv('ADMISSION_CONTROL', 'on').lower() not in ('off', '0', 'false', 'no')
+    return AdaptiveLimiter(name) if enabled else None
+
+
+def init_admission(app, priority_of):
+    """Tag each request with priority_of() for the limiters and answer OverloadedError with 429/503"""
+    retry_after = str(int(os.getenv('ADMISSION_RETRY_AFTER', 1)))
+
+    @app.before_request
+    def set_request_priority():
+        g.priority_token = _priority.set(priority_of())
+
+    @app.teardown_request
+    def reset_request_priority(exc):
+        token = g.pop('priority_token', None)
+        if token is not None:
+            _priority.reset(token)
+
+    @app.errorhandler(OverloadedError)
+    def overloaded(e):
+        response = jsonify({'error': 'Service overloaded, please retry shortly', 'details': str(e)})
+        response.status_code = e.status
+        response.headers['Retry-After'] = retry_after
+        return response
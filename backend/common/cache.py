@@ -0,0 +1,105 @@
+"""
+In-process TTL cache with LRU eviction and hit/miss counters
+
+    cache = TTLCache(max_entries=256, ttl=30, name='catalog')
+    generation = cache.generation
+    value = cache.get(key)
+    if value is None:
+        value = load()
+        cache.set(key, value, generation=generation)
+
+Passing the generation read before loading makes set() a no-op when an
+invalidation happened in between, so a slow read can never put data back into
+the cache that a concurrent write has just invalidated.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Thread-safe bounded cache; entries expire after ttl seconds, least recently used are evicted first"""
+
+    def __init__(self, max_entries=256, ttl=30.0, name='cache'):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.name = name
+        self.generation = 0
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+
+        # Statistics
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    def get(self, key):
+        """Return the cached value or None if missing/expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self._expirations += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(self, key, value, ttl=None, generation=None):
+        """Store a value; skipped if generation is given and an invalidation happened since"""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return False
+            self._entries[key] = (time.monotonic() + (ttl if ttl is not None else self.ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+            return True
+
+    def invalidate(self, *keys):
+        """Drop specific keys"""
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    self._invalidations += 1
+
+    def invalidate_where(self, predicate):
+        """Drop every key for which predicate(key) is true"""
+        with self._lock:
+            self.generation += 1
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+                self._invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        """Snapshot of cache counters for health/metrics endpoints"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'name': self.name,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'invalidations': self._invalidations
+            }
@@ -0,0 +1,128 @@
+"""
+Per-backend circuit breakers, built into every ServiceClient (see common/http_client.py)
+
+    closed      calls go through; failure_threshold consecutive failures (connection errors,
+                timeouts) open the circuit. 5xx responses count neither way: a service
+                that answers 503 because one of its own backends is down is reachable
+    open        calls fail at once with CircuitOpenError, without touching the network,
+                until reset_timeout seconds have passed
+    half_open   up to half_open_max_calls probe calls go through; a success closes the
+                circuit, a failure opens it for another reset_timeout
+
+CircuitOpenError is a requests ConnectionError, so existing handlers answer it like an
+unreachable backend (503) right away instead of after connect errors and timeouts pile up
+worker threads. init_circuit_breakers(app) answers the unhandled ones with 503 + Retry-After.
+
+Configuration (environment variables, per-backend overrides use the client name as
+prefix, e.g. MENU_SERVICE_CIRCUIT_FAILURE_THRESHOLD):
+    CIRCUIT_FAILURE_THRESHOLD     Consecutive failures that open the circuit (default 5)
+    CIRCUIT_RESET_TIMEOUT         Seconds the circuit stays open before probing (default 10)
+    CIRCUIT_HALF_OPEN_MAX_CALLS   Probe calls allowed at once while half open (default 1)
+"""
+import math
+import threading
+import time
+
+import requests
+from flask import jsonify
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Numeric state for metrics gauges
+STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling a backend whose circuit is open"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f'Circuit breaker for {name} is open; retry in {retry_after:.1f}s')
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for one backend"""
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=10.0, half_open_max_calls=1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+
+        # Statistics
+        self._opened = 0
+        self._rejected = 0
+
+    def before_call(self):
+        """Reserve a call, raising CircuitOpenError while the circuit is open or its probes are taken"""
+        with self._lock:
+            if self._state == OPEN:
+                waited = time.monotonic() - self._opened_at
+                if waited < self.reset_timeout:
+                    self._rejected += 1
+                    raise CircuitOpenError(self.name, self.reset_timeout - waited)
+                self._state = HALF_OPEN
+                self._probes = 0
+            if self._state == HALF_OPEN:
+                if self._probes >= self.half_open_max_calls:
+                    self._rejected += 1
+                    raise CircuitOpenError(self.name, self.reset_timeout)
+                self._probes += 1
+
+    def record(self, success):
+        """Report the outcome of a call allowed by before_call(); None counts neither way"""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes = max(self._probes - 1, 0)
+            if success is None:
+                return
+            if success:
+                self._failures = 0
+                self._state = CLOSED
+                return
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self._opened += 1
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def stats(self):
+        """Snapshot of breaker state for health/metrics endpoints"""
+        state = self.state
+        with self._lock:
+            return {
+                'name': self.name,
+                'state': state,
+                'state_code': STATE_CODES[state],
+                'consecutive_failures': self._failures,
+                'opened': self._opened,
+                'rejected': self._rejected
+            }
+
+
+def init_circuit_breakers(app):
+    """Answer CircuitOpenError that a route does not handle itself with 503 and Retry-After"""
+
+    @app.errorhandler(CircuitOpenError)
+    def circuit_open(e):
+        response = jsonify({'error': f'{e.name} is unavailable', 'details': str(e)})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(max(math.ceil(e.retry_after), 1))
+        return response
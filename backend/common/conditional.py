@@ -0,0 +1,32 @@
+"""
+Conditional GET helpers (strong ETags, If-None-Match -> 304)
+
+Services:
+    return conditional_json(menus)
+    return conditional_body(body, etag)   # body serialized ahead of time, etag = generate_etag(body)
+
+The ETag is a hash of the serialized body, so it changes exactly when the
+content changes. A client that sends a matching If-None-Match gets an empty
+304 response instead of the full JSON document.
+"""
+from flask import Response, jsonify, request
+
+# Browsers may store responses but must revalidate them with If-None-Match every time
+PUBLIC_CACHE_CONTROL = 'no-cache'
+PRIVATE_CACHE_CONTROL = 'private, no-cache'
+
+
+def conditional_json(payload, cache_control=PUBLIC_CACHE_CONTROL):
+    """jsonify payload with a strong content-hash ETag, answering 304 when If-None-Match matches"""
+    response = jsonify(payload)
+    response.add_etag()
+    response.headers['Cache-Control'] = cache_control
+    return response.make_conditional(request)
+
+
+def conditional_body(body, etag, cache_control=PUBLIC_CACHE_CONTROL):
+    """Same as conditional_json for a JSON body serialized ahead of time, with its ETag computed once"""
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response.make_conditional(request)
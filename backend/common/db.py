@@ -0,0 +1,296 @@
+"""
+Pooled MySQL connections shared by all services
+
+Usage in a service:
+
+    db_pool = ConnectionPool(load_db_config(), name='menu_service')
+
+    with db_pool.connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        ...
+
+The context manager always hands the connection back to the pool, also when the
+handler returns early or raises. Any transaction left open is rolled back on
+release so the next request never sees uncommitted writes or a stale snapshot.
+
+Inside a request with a deadline (see common/deadline.py) the pool waits no longer
+than the remaining budget, every SELECT carries a /*+ MAX_EXECUTION_TIME(ms) */ hint
+for what is left of it, and the session's innodb_lock_wait_timeout is capped to it, so
+no statement outlives the caller. The lock wait limit is whole seconds and only SET
+when it changes, so requests under the same budget add no round trip.
+
+Configuration (environment variables):
+    DB_POOL_SIZE        Maximum number of open connections per service (default 10)
+    DB_POOL_TIMEOUT     Seconds to wait for a free connection before failing (default 5)
+    DB_CONNECT_TIMEOUT  Seconds allowed for opening a new MySQL connection (default 5)
+    DB_POOL_IDLE_CHECK  Ping connections that were idle longer than this many seconds (default 30)
+"""
+import math
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import Error, errorcode
+from mysql.connector.errors import PoolError
+
+from common.deadline import DeadlineExceeded, check_deadline
+from common.metrics import record_db_time
+from common.tracing import trace_connection
+
+
+def load_db_config():
+    """Read MySQL connection settings from the environment"""
+    return {
+        'host': os.getenv('MYSQL_HOST', 'localhost'),
+        'user': os.getenv('MYSQL_USER', 'root'),
+        'password': os.getenv('MYSQL_PASSWORD', ''),
+        'database': os.getenv('MYSQL_DATABASE', 'pastry_db'),
+        'port': int(os.getenv('MYSQL_PORT', 3306)),
+        'connection_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 5))
+    }
+
+
+SELECT_STATEMENT = re.compile(r'^(\s*SELECT)\b', re.IGNORECASE)
+
+
+class DeadlineCursor:
+    """Cursor proxy that refuses statements after the deadline and gives SELECTs the remaining budget"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, operation, *args, **kwargs):
+        left = check_deadline('running a database statement')
+        if left is not None:
+            hint = f'/*+ MAX_EXECUTION_TIME({max(int(left * 1000), 1)}) */'
+            operation = SELECT_STATEMENT.sub(lambda match: f'{match.group(1)} {hint}', operation, count=1)
+        return self._cursor.execute(operation, *args, **kwargs)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        check_deadline('running a database statement')
+        return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class DeadlineConnection:
+    """Connection proxy whose cursors stop statements at the request deadline"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return DeadlineCursor(self._conn.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class ConnectionPool:
+    """Bounded pool of MySQL connections, opened lazily and reused across requests"""
+
+    def __init__(self, config, size=None, acquire_timeout=None, idle_check_after=None, name='db'):
+        self.config = config
+        self.name = name
+        self.size = size or int(os.getenv('DB_POOL_SIZE', 10))
+        self.acquire_timeout = acquire_timeout if acquire_timeout is not None else float(os.getenv('DB_POOL_TIMEOUT', 5))
+        self.idle_check_after = idle_check_after if idle_check_after is not None else float(os.getenv('DB_POOL_IDLE_CHECK', 30))
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (connection, released_at)
+        self._open = 0
+        self._in_use = 0
+
+        # Statistics
+        self._acquired = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._timeouts = 0
+        self._connects = 0
+        self._discarded = 0
+        self._deadline_timeouts = 0
+
+        # id of connection -> innodb_lock_wait_timeout its session carries from a request's budget
+        self._limited = {}
+
+    def _connect(self):
+        conn = mysql.connector.connect(**self.config)
+        with self._cond:
+            self._connects += 1
+        return conn
+
+    def acquire(self, timeout=None):
+        """
+        Take a connection from the pool, opening a new one if below size; waits up to acquire_timeout,
+        or up to timeout (a request's remaining budget) when that is shorter. The budget is also applied
+        to the session, and a connection taken without one never keeps an earlier request's limit.
+        """
+        started = time.monotonic()
+        wait_limit = self.acquire_timeout if timeout is None else min(timeout, self.acquire_timeout)
+        deadline = started + wait_limit
+        waited = False
+        conn = None
+        released_at = None
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    # Reserve a slot, the connection itself is opened outside the lock
+                    self._open += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    if wait_limit < self.acquire_timeout:
+                        self._deadline_timeouts += 1
+                        raise DeadlineExceeded(
+                            f'Request deadline passed waiting for a "{self.name}" database connection'
+                        )
+                    raise PoolError(
+                        f'Database connection failed: pool "{self.name}" exhausted '
+                        f'({self.size} connections in use for {self.acquire_timeout}s)'
+                    )
+                waited = True
+                self._cond.wait(remaining)
+
+            self._in_use += 1
+            self._acquired += 1
+            if waited:
+                wait_time = time.monotonic() - started
+                self._waits += 1
+                self._wait_time_total += wait_time
+                self._wait_time_max = max(self._wait_time_max, wait_time)
+
+        try:
+            if conn is None:
+                conn = self._connect()
+            elif time.monotonic() - released_at > self.idle_check_after and not conn.is_connected():
+                # Server closed the idle connection (wait_timeout, restart); replace it
+                self._close_quietly(conn)
+                self._limited.pop(id(conn), None)
+                with self._cond:
+                    self._discarded += 1
+                conn = self._connect()
+        except Exception as e:
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise PoolError(f'Database connection failed: {e}')
+
+        try:
+            left = None if timeout is None else timeout - (time.monotonic() - started)
+            self._limit_statements(conn, left)
+        except Error:
+            self.release(conn, discard=True)
+            raise
+        return conn
+
+    def release(self, conn, discard=False):
+        """
+        Return a connection to the pool, rolling back any open transaction; broken connections are dropped.
+        discard=True closes it instead, e.g. when an abandoned unbuffered result would have to be drained first.
+        """
+        keep = not discard
+        try:
+            if keep and (conn.in_transaction or conn.unread_result):
+                conn.rollback()
+        except Error:
+            keep = False
+
+        if not keep:
+            self._close_quietly(conn)
+            self._limited.pop(id(conn), None)
+
+        with self._cond:
+            self._in_use -= 1
+            if keep:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._open -= 1
+                self._discarded += 1
+            self._cond.notify()
+
+    def _limit_statements(self, conn, seconds):
+        """Cap the session's lock waits to a request's remaining budget, or lift a cap left by an earlier request"""
+        lock_wait = None if seconds is None else max(math.ceil(seconds), 1)
+        if self._limited.get(id(conn)) == lock_wait:
+            return
+        if lock_wait is None:
+            statement = 'SET SESSION innodb_lock_wait_timeout = DEFAULT'
+        else:
+            statement = f'SET SESSION innodb_lock_wait_timeout = {lock_wait}'
+        cursor = conn.cursor()
+        cursor.execute(statement)
+        cursor.close()
+        if lock_wait is None:
+            self._limited.pop(id(conn), None)
+        else:
+            self._limited[id(conn)] = lock_wait
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager that borrows a connection and always returns it; the time held is reported
+        to metrics, inside a traced request every statement is recorded as a span, and inside a
+        request with a deadline statements are cut off when the budget runs out
+        """
+        started = time.perf_counter()
+        left = check_deadline('acquiring a database connection')
+        conn = self.acquire(timeout=left)
+        try:
+            yield trace_connection(conn if left is None else DeadlineConnection(conn))
+        except Error as e:
+            if left is not None and e.errno in (errorcode.ER_QUERY_TIMEOUT, errorcode.ER_LOCK_WAIT_TIMEOUT):
+                with self._cond:
+                    self._deadline_timeouts += 1
+                raise DeadlineExceeded(f'Database statement stopped at the request deadline: {e.msg}') from e
+            raise
+        finally:
+            self.release(conn)
+            record_db_time(self.name, time.perf_counter() - started)
+
+    def close_all(self):
+        """Close idle connections (connections in use are closed when released)"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open -= len(idle)
+        for conn, _ in idle:
+            self._close_quietly(conn)
+            self._limited.pop(id(conn), None)
+
+    def stats(self):
+        """Snapshot of pool usage for health/metrics endpoints"""
+        with self._cond:
+            return {
+                'name': self.name,
+                'size': self.size,
+                'open': self._open,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'acquired': self._acquired,
+                'waits': self._waits,
+                'wait_time_total_ms': round(self._wait_time_total * 1000, 3),
+                'wait_time_max_ms': round(self._wait_time_max * 1000, 3),
+                'timeouts': self._timeouts,
+                'deadline_timeouts': self._deadline_timeouts,
+                'connects': self._connects,
+                'discarded': self._discarded
+            }
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Error:
+            pass
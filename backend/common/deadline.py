@@ -0,0 +1,117 @@
+"""
+Request deadlines propagated from the API Gateway down to MySQL
+
+    init_deadlines(app)                              # services: the budget comes from the caller
+    init_deadlines(app, default_budget_ms=10000)     # gateway: every request gets a budget
+
+The gateway gives every request a time budget (GATEWAY_REQUEST_BUDGET_MS, or less when the
+client sends a smaller X-Request-Budget-Ms). A service turns the incoming X-Request-Budget-Ms
+into a deadline the moment the request arrives, so the time it spends itself is subtracted
+from everything it calls:
+
+    common/http_client.py   forwards the remaining budget as X-Request-Budget-Ms and caps
+                            connect/read timeouts to it
+    common/db.py            waits for a pooled connection no longer than the remaining budget,
+                            gives each SELECT a MAX_EXECUTION_TIME hint for it and caps the
+                            session's innodb_lock_wait_timeout (row locks)
+
+Once the budget is spent, the next query or call raises DeadlineExceeded instead of starting,
+and the request is answered 504. A request arriving with no budget left is answered 504
+without running the handler. Long-lived routes (SSE, exports) opt out with @without_deadline.
+"""
+import contextvars
+import time
+
+from flask import g, jsonify, request
+
+BUDGET_HEADER = 'X-Request-Budget-Ms'
+
+_deadline = contextvars.ContextVar('request_deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The caller's time budget ran out; the remaining work is abandoned"""
+
+
+def remaining():
+    """Seconds left until the current request's deadline, None when the request has none"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check_deadline(action):
+    """Raise DeadlineExceeded when the budget is spent; returns the seconds left (or None)"""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f'Request deadline passed before {action}')
+    return left
+
+
+def capped_timeout(timeout, action='waiting'):
+    """A requests-style timeout (seconds or (connect, read)) limited to the remaining budget"""
+    left = check_deadline(action)
+    if left is None:
+        return timeout
+    if timeout is None:
+        return left
+    if isinstance(timeout, tuple):
+        return tuple(left if part is None else min(part, left) for part in timeout)
+    return min(timeout, left)
+
+
+def budget_headers(headers=None):
+    """Add the remaining budget as X-Request-Budget-Ms to an outbound request's headers"""
+    left = remaining()
+    if left is None:
+        return headers
+    headers = dict(headers or {})
+    headers[BUDGET_HEADER] = str(max(int(left * 1000), 0))
+    return headers
+
+
+def without_deadline(view):
+    """Exempt a route (streams, exports) from request budgets"""
+    view.without_deadline = True
+    return view
+
+
+def parse_budget(value):
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def init_deadlines(app, default_budget_ms=None):
+    """Start each request's deadline from X-Request-Budget-Ms (capped by default_budget_ms) and answer 504 when it passes"""
+
+    @app.before_request
+    def start_deadline():
+        view = app.view_functions.get(request.endpoint)
+        if view is not None and getattr(view, 'without_deadline', False):
+            return None
+
+        budget_ms = parse_budget(request.headers.get(BUDGET_HEADER))
+        if default_budget_ms:
+            budget_ms = default_budget_ms if budget_ms is None else min(budget_ms, default_budget_ms)
+        if budget_ms is None:
+            return None
+        if budget_ms <= 0:
+            return jsonify({
+                'error': 'Deadline exceeded',
+                'details': 'The caller has no time budget left for this request'
+            }), 504
+        g.deadline_token = _deadline.set(time.monotonic() + budget_ms / 1000)
+        return None
+
+    @app.teardown_request
+    def reset_deadline(exc):
+        token = g.pop('deadline_token', None)
+        if token is not None:
+            _deadline.reset(token)
+
+    @app.errorhandler(DeadlineExceeded)
+    def deadline_exceeded(e):
+        return jsonify({'error': 'Deadline exceeded', 'details': str(e)}), 504
@@ -0,0 +1,107 @@
+"""
+In-process publish/subscribe for Server-Sent Events
+
+    order_events = EventBroker(name='orders')
+    order_events.publish('order_created', {'id': 7, 'customer_username': 'customer'})
+
+    subscription = order_events.subscribe(last_event_id=5)
+    event = subscription.get(timeout=15)   # None on timeout
+    yield format_sse(event)
+
+Every event gets a monotonically increasing id. The last `history` events are
+kept so a client reconnecting with Last-Event-ID receives what it missed. A
+subscriber that falls `queue_size` events behind is closed instead of letting
+its queue grow without bound; the client reconnects and catches up from history.
+"""
+import json
+import queue
+import threading
+from collections import deque
+
+
+def format_sse(event):
+    """Serialize an event as a text/event-stream frame"""
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+
+
+class Subscription:
+    """One connected stream client"""
+
+    def __init__(self, broker, queue_size):
+        self._broker = broker
+        self._queue = queue.Queue(maxsize=queue_size)
+        self.closed = False
+
+    def _offer(self, event):
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except queue.Full:
+            return False
+
+    def get(self, timeout=None):
+        """Next event, or None if nothing arrived within timeout"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.closed = True
+        self._broker.unsubscribe(self)
+
+
+class EventBroker:
+    """Fan out published events to all current subscribers"""
+
+    def __init__(self, history=256, queue_size=100, name='events'):
+        self.name = name
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._history = deque(maxlen=history)
+        self._subscribers = set()
+        self._last_id = 0
+        self._published = 0
+        self._dropped_subscribers = 0
+
+    def publish(self, event_type, data):
+        """Send an event to every subscriber and keep it in the replay history"""
+        with self._lock:
+            self._last_id += 1
+            self._published += 1
+            event = {'id': self._last_id, 'type': event_type, 'data': data}
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+
+        for subscription in subscribers:
+            if not subscription._offer(event):
+                # Too far behind; the client reconnects with Last-Event-ID and replays from history
+                with self._lock:
+                    self._dropped_subscribers += 1
+                subscription.close()
+        return event
+
+    def subscribe(self, last_event_id=None):
+        """Register a subscriber, replaying history newer than last_event_id"""
+        subscription = Subscription(self, self.queue_size)
+        with self._lock:
+            if last_event_id is not None:
+                for event in self._history:
+                    if event['id'] > last_event_id:
+                        subscription._offer(event)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'subscribers': len(self._subscribers),
+                'published': self._published,
+                'last_event_id': self._last_id,
+                'dropped_subscribers': self._dropped_subscribers
+            }
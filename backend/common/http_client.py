@@ -0,0 +1,292 @@
+"""
+Pooled keep-alive HTTP clients for service-to-service calls
+
+Each backend gets one ServiceClient holding a requests.Session, so TCP connections
+are kept alive and reused across requests instead of being opened per call.
+
+    menu_client = ServiceClient(MENU_SERVICE_URL, name='menu_service')
+    response = menu_client.get('/menus')
+
+MENU_SERVICE_URL may list several replicas (comma separated); calls are balanced across
+the healthy ones, see common/replicas.py. pin_to_primary(method, path) returning True (or
+primary=True on the call) sends a call to the replica set's primary instead.
+
+Configuration (environment variables, per-backend overrides use the client name as
+prefix, e.g. MENU_SERVICE_HTTP_POOL_SIZE):
+    HTTP_POOL_SIZE        Keep-alive connections kept per backend (default 20)
+    HTTP_CONNECT_TIMEOUT  Seconds allowed to open a connection (default 2)
+    HTTP_READ_TIMEOUT     Seconds allowed to wait for a response (default 10)
+    HTTP_RETRIES          Retries for connection errors and idempotent requests (default 2)
+    HTTP_RETRY_BACKOFF    Backoff factor between retries in seconds (default 0.1)
+    CIRCUIT_*             Circuit breaker settings, see common/circuit_breaker.py
+    REPLICA_*             Replica health check settings, see common/replicas.py
+
+A client given an AdaptiveLimiter (common/admission.py) also caps its calls in flight
+and sheds lower-priority calls first when the backend slows down.
+"""
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, MaxRetryError, NewConnectionError, ReadTimeoutError
+from urllib3.util.retry import Retry
+
+from common.admission import OverloadedError
+from common.circuit_breaker import CircuitBreaker
+from common.deadline import DeadlineExceeded, budget_headers, capped_timeout, remaining
+from common.metrics import record_http_time
+from common.replicas import ReplicaSet
+from common.tracing import outgoing_headers, span
+
+
+def _setting(name, key, default, cast):
+    """Read a per-backend setting, falling back to the global one"""
+    value = os.getenv(f'{name.upper()}_{key}', os.getenv(key))
+    return cast(value) if value not in (None, '') else default
+
+
+def unwrap_timeout(error):
+    """
+    With a urllib3 Retry mounted, requests reports a timeout that used up the retries as
+    ConnectionError(MaxRetryError(ReadTimeoutError)); return the Timeout it really is, else error
+    """
+    reason = error.args[0] if error.args else None
+    if isinstance(reason, MaxRetryError):
+        reason = reason.reason
+    if isinstance(reason, ReadTimeoutError):
+        return requests.exceptions.ReadTimeout(reason, request=error.request, response=error.response)
+    if isinstance(reason, ConnectTimeoutError) and not isinstance(reason, NewConnectionError):
+        return requests.exceptions.ConnectTimeout(reason, request=error.request, response=error.response)
+    return error
+
+
+def connect_failed(error):
+    """True when a requests ConnectionError means the backend was never reached (refused, connect timeout)"""
+    reason = error.args[0] if error.args else None
+    if isinstance(reason, MaxRetryError):
+        reason = reason.reason
+    return isinstance(error, requests.exceptions.ConnectTimeout) or isinstance(reason, (ConnectTimeoutError, NewConnectionError))
+
+
+class ServiceClient:
+    """Keep-alive HTTP client bound to one backend service (one or more replicas)"""
+
+    def __init__(self, base_url, name='service', pool_size=None, connect_timeout=None,
+                 read_timeout=None, retries=None, retry_backoff=None, limiter=None, pin_to_primary=None):
+        self.name = name
+        self.pin_to_primary = pin_to_primary
+        self.replicas = ReplicaSet(
+            base_url,
+            name=name,
+            health_interval=_setting(name, 'REPLICA_HEALTH_INTERVAL', 5.0, float),
+            health_timeout=_setting(name, 'REPLICA_HEALTH_TIMEOUT', 1.0, float),
+            unhealthy_threshold=_setting(name, 'REPLICA_UNHEALTHY_THRESHOLD', 2, int),
+            healthy_threshold=_setting(name, 'REPLICA_HEALTHY_THRESHOLD', 2, int)
+        )
+        self.base_url = self.replicas.replicas[0].url
+        self.limiter = limiter
+        self.pool_size = pool_size or _setting(name, 'HTTP_POOL_SIZE', 20, int)
+        self.connect_timeout = connect_timeout or _setting(name, 'HTTP_CONNECT_TIMEOUT', 2.0, float)
+        self.read_timeout = read_timeout or _setting(name, 'HTTP_READ_TIMEOUT', 10.0, float)
+
+        self.retries = retries if retries is not None else _setting(name, 'HTTP_RETRIES', 2, int)
+        self.retry_backoff = retry_backoff if retry_backoff is not None else _setting(name, 'HTTP_RETRY_BACKOFF', 0.1, float)
+
+        # Retries happen in _send, where each attempt gets what is left of the request's budget;
+        # urllib3 itself never resends (read=False also keeps timeouts reported as Timeout)
+        self._adapter = HTTPAdapter(
+            pool_connections=len(self.replicas), pool_maxsize=self.pool_size,
+            max_retries=Retry(total=0, read=False), pool_block=False
+        )
+
+        self.session = requests.Session()
+        self.session.mount('http://', self._adapter)
+        self.session.mount('https://', self._adapter)
+
+        # Fails calls fast while the backend keeps failing, instead of waiting for each timeout
+        self.breaker = CircuitBreaker(
+            name,
+            failure_threshold=_setting(name, 'CIRCUIT_FAILURE_THRESHOLD', 5, int),
+            reset_timeout=_setting(name, 'CIRCUIT_RESET_TIMEOUT', 10.0, float),
+            half_open_max_calls=_setting(name, 'CIRCUIT_HALF_OPEN_MAX_CALLS', 1, int)
+        )
+
+        # Statistics
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._requests = 0
+        self._errors = 0
+
+    @property
+    def timeout(self):
+        return (self.connect_timeout, self.read_timeout)
+
+    def request(self, method, path, **kwargs):
+        """
+        Send a request to path on a replica using the pooled session (traced, request id forwarded);
+        inside a request with a deadline the timeouts are capped to the remaining budget, which is
+        forwarded as X-Request-Budget-Ms, and nothing is sent (or resent) once it is spent (DeadlineExceeded).
+        While the backend's circuit is open, CircuitOpenError is raised without sending anything,
+        and OverloadedError when the client's limiter has no room for the request's priority
+        (streamed calls are not limited). retries= overrides the client's HTTP_RETRIES for this call,
+        primary=True sends it to the primary replica like pin_to_primary.
+        """
+        timeout = kwargs.pop('timeout', self.timeout)
+        retries = kwargs.pop('retries', self.retries)
+        capped_timeout(timeout, f'calling {self.name}')
+        self.breaker.before_call()
+        # A stream holds its connection while the client reads and answers at the headers,
+        # so it would neither fit the concurrency limit nor give a latency sample
+        limiter = None if kwargs.get('stream') else self.limiter
+        if limiter is not None:
+            try:
+                limiter.acquire()
+            except OverloadedError:
+                self.breaker.record(None)
+                raise
+        healthy = False
+        with self._lock:
+            self._in_flight += 1
+            self._requests += 1
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            with span('http', f'{method} {self.name}{path}') as record:
+                kwargs['headers'] = budget_headers(outgoing_headers(kwargs.get('headers')))
+                try:
+                    response = self._send(method, path, timeout, retries, kwargs)
+                except requests.exceptions.ConnectionError as e:
+                    error = unwrap_timeout(e)
+                    if error is e:
+                        raise
+                    raise error from e
+                status = response.status_code
+                if record is not None:
+                    record['status'] = status
+            # A 5xx may come from the backend's own backends (Order Service relaying a Customer
+            # Service outage); only connection errors and timeouts count against this one
+            healthy = True if status < 500 else None
+            return response
+        except requests.exceptions.Timeout:
+            if kwargs['timeout'] != timeout:
+                # Cut short by the caller's budget, which says nothing about the backend
+                healthy = None
+            raise
+        except DeadlineExceeded:
+            healthy = None
+            raise
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                if status == 'error':
+                    self._errors += 1
+            elapsed = time.perf_counter() - started
+            self.breaker.record(healthy)
+            if limiter is not None:
+                limiter.release(rtt=elapsed if healthy else None, dropped=healthy is False)
+            record_http_time(self.name, method, status, elapsed)
+
+    def _send(self, method, path, timeout, retries, kwargs):
+        """
+        Send to the replica the balancer picks, or to the primary when pinned, retrying
+        up to `retries` times. Every attempt's timeout is capped to the request's remaining budget, and
+        no attempt starts once it is spent, so retries never outlast the caller.
+
+        A replica that cannot be connected to is ejected and the next attempt goes to another one (nothing
+        was sent, so this is safe for a POST too); for pinned calls that one becomes the primary. Read errors and timeouts are only retried for idempotent
+        methods, since a POST may have arrived; the slow replica is left to the health checks.
+        """
+        method = method.upper()
+        pinned = kwargs.pop('primary', False) or (self.pin_to_primary is not None and self.pin_to_primary(method, path))
+        tried = []
+        failures = 0
+        while True:
+            kwargs['timeout'] = capped_timeout(timeout, f'calling {self.name}')
+            replica = self.replicas.pick_primary(exclude=tried) if pinned else self.replicas.pick(exclude=tried)
+            try:
+                response = self.session.request(method, f'{replica.url}{path}', **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                unreachable = connect_failed(e)
+                self.replicas.release(replica, failed=unreachable, error=type(e).__name__)
+                tried.append(replica)
+                failures += 1
+                # An untried replica after a failed connect does not use up a retry
+                failover = unreachable and len(tried) < len(self.replicas)
+                if not failover and (failures > retries or not (unreachable or method in Retry.DEFAULT_ALLOWED_METHODS)):
+                    raise
+                delay = 0 if failover or failures == 1 else self.retry_backoff * (2 ** (failures - 2))
+                left = remaining()
+                if left is not None and left <= delay:
+                    raise
+                time.sleep(delay)
+                continue
+            except BaseException:
+                self.replicas.release(replica)
+                raise
+            self.replicas.release(replica)
+            return response
+
+    def broadcast(self, method, path, **kwargs):
+        """
+        Send a control request (cache invalidation, catalog refresh) to every healthy replica,
+        bypassing breaker and limiter; returns how many replicas accepted it
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        kwargs['headers'] = outgoing_headers(kwargs.get('headers'))
+        accepted = 0
+        for url in self.replicas.healthy_urls():
+            try:
+                if self.session.request(method, f'{url}{path}', **kwargs).status_code < 400:
+                    accepted += 1
+            except requests.exceptions.RequestException as e:
+                print(f"ERROR: {method} {path} to {url} failed: {str(e)}")
+        return accepted
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request('PUT', path, **kwargs)
+
+    def patch(self, path, **kwargs):
+        return self.request('PATCH', path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request('DELETE', path, **kwargs)
+
+    def stats(self):
+        """Snapshot of client usage and keep-alive pool state for health/metrics endpoints"""
+        open_connections = 0
+        idle_connections = 0
+        pools = self._adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None or pool.pool is None:
+                continue
+            open_connections += pool.num_connections
+            idle_connections += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+        breaker = self.breaker.stats()
+        with self._lock:
+            return {
+                'name': self.name,
+                'pool_size': self.pool_size,
+                'in_flight': self._in_flight,
+                'requests': self._requests,
+                'errors': self._errors,
+                'connections_opened': open_connections,
+                'idle_connections': idle_connections,
+                'replicas': len(self.replicas),
+                'healthy_replicas': self.replicas.healthy_count(),
+                'circuit_state': breaker['state'],
+                'circuit_state_code': breaker['state_code'],
+                'circuit_opened': breaker['opened'],
+                'circuit_rejected': breaker['rejected']
+            }
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,217 @@
+"""
+Prometheus-style metrics shared by the API Gateway and all microservices
+
+    init_metrics(app, 'order_service', db_pools=[db_pool], http_clients=[menu_client],
+                 stats_sources={'cache': [validation_cache]})
+
+registers request hooks and GET /metrics (Prometheus text format). Recorded series:
+    http_requests_total                 requests per method, route and status
+    http_request_duration_seconds       latency histogram per method and route
+    http_request_db_seconds             time each request spent in MySQL (holding a pooled connection)
+    http_request_upstream_seconds       time each request spent in outbound HTTP calls to other services
+    db_connection_seconds               every pooled connection use, per pool
+    http_client_request_seconds         every outbound call, per backend, method and status
+    db_pool_* / http_client_* / ...     gauges from the stats() of pools, clients, caches and brokers
+
+common/db.py and common/http_client.py report into the module-level registry, so
+services only call init_metrics(). Streaming responses (SSE, exports) are timed up
+to the moment the stream starts.
+"""
+import threading
+import time
+from contextvars import ContextVar
+
+from flask import Response, g, request
+
+# Prometheus client default buckets (seconds)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+# Per-request accumulators for DB / outbound HTTP time, set while a request is handled
+_request_timings = ContextVar('request_timings', default=None)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for key, value in labels:
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{escaped}"')
+    return '{' + ','.join(parts) + '}'
+
+
+class Histogram:
+    """Cumulative-bucket histogram for one label set"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms plus gauge collectors, rendered as Prometheus text"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}     # name -> {labels: value}
+        self._histograms = {}   # name -> {labels: Histogram}
+        self._collectors = []
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def inc(self, name, labels=(), value=1):
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + value
+
+    def observe(self, name, labels=(), value=0.0, buckets=DEFAULT_BUCKETS):
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(labels)
+            if histogram is None:
+                histogram = series[labels] = Histogram(buckets)
+            histogram.observe(value)
+
+    def add_collector(self, collector):
+        """collector() returns (name, labels, value) gauge samples, called on every scrape"""
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                self._header(lines, name, 'counter')
+                for labels, value in sorted(series.items()):
+                    lines.append(f'{name}{_format_labels(labels)} {value}')
+
+            for name, series in sorted(self._histograms.items()):
+                self._header(lines, name, 'histogram')
+                for labels, histogram in sorted(series.items(), key=lambda item: item[0]):
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{name}_bucket{_format_labels(labels + (("le", bound),))} {count}')
+                    lines.append(f'{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {histogram.count}')
+                    lines.append(f'{name}_sum{_format_labels(labels)} {round(histogram.sum, 6)}')
+                    lines.append(f'{name}_count{_format_labels(labels)} {histogram.count}')
+
+        gauges = {}
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                gauges.setdefault(name, []).append((labels, value))
+        for name, samples in sorted(gauges.items()):
+            self._header(lines, name, 'gauge')
+            for labels, value in samples:
+                lines.append(f'{name}{_format_labels(labels)} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+    def _header(self, lines, name, metric_type):
+        if name in self._help:
+            lines.append(f'# HELP {name} {self._help[name]}')
+        lines.append(f'# TYPE {name} {metric_type}')
+
+
+metrics = MetricsRegistry()
+metrics.describe('http_requests_total', 'Requests handled, by method, route and status')
+metrics.describe('http_request_duration_seconds', 'Request latency, by method and route')
+metrics.describe('http_request_db_seconds', 'Time a request spent holding MySQL connections')
+metrics.describe('http_request_upstream_seconds', 'Time a request spent in outbound HTTP calls')
+metrics.describe('db_connection_seconds', 'Duration of each pooled MySQL connection use, including pool wait')
+metrics.describe('http_client_request_seconds', 'Duration of each outbound HTTP call')
+
+
+def record_db_time(pool_name, seconds):
+    """Called by ConnectionPool for every connection() block"""
+    metrics.observe('db_connection_seconds', (('pool', pool_name),), seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings['db'] += seconds
+
+
+def record_http_time(backend, method, status, seconds):
+    """Called by ServiceClient for every outbound request; status is the code or 'error'"""
+    metrics.observe(
+        'http_client_request_seconds',
+        (('backend', backend), ('method', method), ('status', str(status))),
+        seconds
+    )
+    timings = _request_timings.get()
+    if timings is not None:
+        timings['http'] += seconds
+
+
+def stats_collector(prefix, label, sources):
+    """Gauge collector exposing every numeric stats() value of the given objects"""
+    def collect():
+        samples = []
+        for source in sources:
+            stats = source.stats()
+            labels = ((label, stats.get('name', getattr(source, 'name', prefix))),)
+            for key, value in stats.items():
+                if isinstance(value, bool):
+                    value = int(value)
+                if isinstance(value, (int, float)):
+                    samples.append((f'{prefix}_{key}', labels, value))
+        return samples
+    return collect
+
+
+def init_metrics(app, service_name, db_pools=(), http_clients=(), stats_sources=None):
+    """
+    Time every request of app and expose GET /metrics
+    stats_sources maps a gauge prefix to objects with stats(), e.g. {'cache': [catalog_cache]}
+    """
+    metrics.add_collector(lambda: [('service_info', (('service', service_name),), 1)])
+    if db_pools:
+        metrics.add_collector(stats_collector('db_pool', 'pool', db_pools))
+    if http_clients:
+        metrics.add_collector(stats_collector('http_client', 'backend', http_clients))
+    for prefix, sources in (stats_sources or {}).items():
+        metrics.add_collector(stats_collector(prefix, prefix, sources))
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+        g.metrics_timings = {'db': 0.0, 'http': 0.0}
+        g.metrics_token = _request_timings.set(g.metrics_timings)
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.pop('metrics_started', None)
+        if started is None or request.path == '/metrics':
+            return response
+        duration = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        timings = g.metrics_timings
+
+        metrics.inc('http_requests_total', (
+            ('method', request.method), ('route', route), ('status', str(response.status_code))
+        ))
+        labels = (('method', request.method), ('route', route))
+        metrics.observe('http_request_duration_seconds', labels, duration)
+        metrics.observe('http_request_db_seconds', labels, timings['db'])
+        metrics.observe('http_request_upstream_seconds', labels, timings['http'])
+        return response
+
+    @app.teardown_request
+    def reset_request_timings(exc):
+        token = g.pop('metrics_token', None)
+        if token is not None:
+            _request_timings.reset(token)
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics_endpoint():
+        """Prometheus scrape endpoint"""
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    return metrics
@@ -0,0 +1,192 @@
+"""
+Replica sets for ServiceClient: balancing across several instances of one service
+
+    MENU_SERVICE_URL=http://menu-1:5003,http://menu-2:5003
+
+A service URL setting may list several replicas, comma separated. Every call goes to the
+less busy of two randomly chosen healthy replicas (power of two choices on outstanding
+requests), which spreads load almost as well as least-outstanding-requests without every
+caller piling onto the same replica.
+
+With more than one replica a background thread polls each replica's GET /health. A replica
+is ejected after REPLICA_UNHEALTHY_THRESHOLD failed checks, or at once when a call to it
+fails to connect, and re-admitted after REPLICA_HEALTHY_THRESHOLD successful checks. If
+every replica is ejected, calls go to all of them rather than to none.
+
+Requests that depend on in-process state, such as order writes and the order event stream
+(see common/events.py) or catalog version deltas, can be pinned to one replica instead
+(pin_to_primary on ServiceClient). The primary starts as the first replica. When it is
+ejected, the first healthy replica in configured order takes over and keeps the role after
+the old one recovers, so a stream opened on the new primary keeps seeing the writes; every
+caller with the same view of replica health therefore moves to the same replica.
+
+Configuration (environment variables, per-backend overrides use the client name as
+prefix, e.g. MENU_SERVICE_REPLICA_HEALTH_INTERVAL):
+    REPLICA_HEALTH_INTERVAL         Seconds between health checks (default 5)
+    REPLICA_HEALTH_TIMEOUT          Timeout of one health check in seconds (default 1)
+    REPLICA_UNHEALTHY_THRESHOLD     Failed checks that eject a replica (default 2)
+    REPLICA_HEALTHY_THRESHOLD       Successful checks that re-admit it (default 2)
+"""
+import random
+import threading
+import time
+
+import requests
+
+
+def parse_replica_urls(urls):
+    """'http://a:5003, http://b:5003' or a list -> ['http://a:5003', 'http://b:5003']"""
+    if isinstance(urls, str):
+        urls = urls.split(',')
+    return [url.strip().rstrip('/') for url in urls if url and url.strip()]
+
+
+class Replica:
+    """One instance of a backend service"""
+
+    def __init__(self, url):
+        self.url = url
+        self.healthy = True
+        self.in_flight = 0
+        self.requests = 0
+        self.ejections = 0
+        self.check_failures = 0
+        self.check_successes = 0
+        self.last_error = None
+
+
+class ReplicaSet:
+    """Health-aware power-of-two-choices balancer over the replicas of one service"""
+
+    def __init__(self, urls, name='service', health_path='/health', health_interval=5.0,
+                 health_timeout=1.0, unhealthy_threshold=2, healthy_threshold=2):
+        self.name = name
+        self.replicas = [Replica(url) for url in parse_replica_urls(urls)]
+        if not self.replicas:
+            raise ValueError(f'No URL configured for {name}')
+        self.health_path = health_path
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.unhealthy_threshold = unhealthy_threshold
+        self.healthy_threshold = healthy_threshold
+
+        self._lock = threading.Lock()
+        self._primary = self.replicas[0]
+        self._checker = None
+        if len(self.replicas) > 1:
+            self._checker = threading.Thread(target=self._check_loop, name=f'{name}-health', daemon=True)
+            self._checker.start()
+
+    def __len__(self):
+        return len(self.replicas)
+
+    def pick(self, exclude=()):
+        """Reserve the less busy of two random healthy replicas; release() it when the call is done"""
+        with self._lock:
+            candidates = [replica for replica in self.replicas if replica not in exclude]
+            healthy = [replica for replica in candidates if replica.healthy]
+            candidates = healthy or candidates or self.replicas
+            if len(candidates) == 1:
+                chosen = candidates[0]
+            else:
+                first, second = random.sample(candidates, 2)
+                chosen = first if first.in_flight <= second.in_flight else second
+            chosen.in_flight += 1
+            chosen.requests += 1
+            return chosen
+
+    def pick_primary(self, exclude=()):
+        """
+        Reserve the primary, for requests that must all reach the same replica; a primary that is
+        ejected (or excluded after failing to connect) hands the role to the first healthy replica
+        """
+        with self._lock:
+            chosen = self._primary
+            if not chosen.healthy or chosen in exclude:
+                candidates = [replica for replica in self.replicas if replica not in exclude]
+                promoted = next((replica for replica in candidates if replica.healthy), None)
+                if promoted is not None:
+                    print(f"WARNING: {self.name} primary moved from {chosen.url} to {promoted.url}")
+                    self._primary = chosen = promoted
+                elif chosen in exclude and candidates:
+                    # Every replica is ejected: try the next one without moving the role
+                    chosen = candidates[0]
+            chosen.in_flight += 1
+            chosen.requests += 1
+            return chosen
+
+    def release(self, replica, failed=False, error=None):
+        """Return a reservation; failed=True (could not connect) ejects the replica until it passes health checks"""
+        with self._lock:
+            replica.in_flight -= 1
+            if failed and self._checker is not None:
+                self._eject(replica, error)
+
+    def _eject(self, replica, error):
+        if replica.healthy:
+            replica.healthy = False
+            replica.ejections += 1
+            print(f"WARNING: {self.name} replica {replica.url} ejected: {error}")
+        replica.check_successes = 0
+        replica.last_error = str(error) if error else None
+
+    def check(self, session=None):
+        """Probe every replica's health route once and eject / re-admit accordingly"""
+        session = session or requests
+        for replica in self.replicas:
+            error = None
+            try:
+                response = session.get(f'{replica.url}{self.health_path}', timeout=self.health_timeout)
+                if response.status_code != 200:
+                    error = f'health check returned {response.status_code}'
+            except requests.exceptions.RequestException as e:
+                error = f'health check failed: {type(e).__name__}'
+
+            with self._lock:
+                if error is None:
+                    replica.check_failures = 0
+                    replica.check_successes += 1
+                    if not replica.healthy and replica.check_successes >= self.healthy_threshold:
+                        replica.healthy = True
+                        replica.last_error = None
+                        print(f"INFO: {self.name} replica {replica.url} re-admitted")
+                else:
+                    replica.check_successes = 0
+                    replica.check_failures += 1
+                    if replica.check_failures >= self.unhealthy_threshold:
+                        self._eject(replica, error)
+
+    def _check_loop(self):
+        session = requests.Session()
+        while True:
+            time.sleep(self.health_interval)
+            try:
+                self.check(session)
+            except Exception as e:
+                print(f"ERROR: {self.name} replica health check failed: {str(e)}")
+
+    def healthy_urls(self):
+        with self._lock:
+            return [replica.url for replica in self.replicas if replica.healthy] or [
+                replica.url for replica in self.replicas
+            ]
+
+    def healthy_count(self):
+        with self._lock:
+            return sum(1 for replica in self.replicas if replica.healthy)
+
+    def stats(self):
+        """Per-replica state for health endpoints"""
+        with self._lock:
+            return [
+                {
+                    'url': replica.url,
+                    'healthy': replica.healthy,
+                    'primary': replica is self._primary,
+                    'in_flight': replica.in_flight,
+                    'requests': replica.requests,
+                    'ejections': replica.ejections,
+                    'last_error': replica.last_error
+                }
+                for replica in self.replicas
+            ]
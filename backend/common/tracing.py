@@ -0,0 +1,293 @@
+"""
+Request-ID propagation and per-hop timing spans
+
+    init_tracing(app, 'order_service')
+
+Every request gets an id: the incoming X-Request-ID header (set by the gateway or a
+caller) or a new one. While the request runs, spans are recorded for the handler,
+every SQL statement (common/db.py wraps pooled connections) and every outbound call
+(common/http_client.py, which also forwards X-Request-ID and X-Parent-Span-ID so the
+next service attaches its spans to the calling span).
+
+The response carries X-Request-ID and a Server-Timing header (handler / db / http
+totals). With TRACE_EXPORT set, finished spans are written as JSON lines, one per span:
+
+    {"request_id": "...", "span_id": "...", "parent_id": "...", "service": "order_service",
+     "kind": "sql", "name": "SELECT id, price FROM menu_items ...", "start": 1763114400.123, "duration_ms": 1.9}
+
+Grouping the lines of all services by request_id and linking parent_id -> span_id rebuilds
+the whole call tree of one request. Work handed to a thread pool only joins the trace when
+submitted through submit_in_context().
+
+Spans are written by a background thread, so requests never wait on the file; when it falls
+behind, whole traces are dropped instead of queueing without bound.
+
+Configuration (environment variables, read by init_tracing):
+    TRACE_EXPORT          none (default), file or stdout
+    TRACE_FILE            JSON lines file for TRACE_EXPORT=file (default traces.jsonl in the working directory)
+    TRACE_FILE_MAX_MB     TRACE_FILE is moved to TRACE_FILE.1 when it grows past this size (default 100)
+    TRACE_QUEUE_SIZE      Traces waiting for the writer before new ones are dropped (default 1000)
+"""
+import contextvars
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from flask import g, request
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+PARENT_SPAN_HEADER = 'X-Parent-Span-ID'
+MAX_SPAN_NAME_LENGTH = 200
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+class Trace:
+    """Spans of one request inside one service"""
+
+    def __init__(self, request_id, service):
+        self.request_id = request_id
+        self.service = service
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+
+class SpanExporter:
+    """Append finished spans as JSON lines to a file or stdout from a background thread"""
+
+    def __init__(self, target='none', path='traces.jsonl', max_bytes=100 * 1024 * 1024, queue_size=1000):
+        self.target = target
+        self.path = path
+        self.max_bytes = max_bytes
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._dropped = 0
+        if target != 'none':
+            threading.Thread(target=self._run, name='span-exporter', daemon=True).start()
+
+    def export(self, spans):
+        """Queue the spans of one finished request; dropped when the writer is behind"""
+        if self.target == 'none' or not spans:
+            return
+        try:
+            self._queue.put_nowait(list(spans))
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+
+    def flush(self):
+        """Wait until every queued span is written"""
+        if self.target != 'none':
+            self._queue.join()
+
+    def stats(self):
+        with self._lock:
+            return {'target': self.target, 'queued': self._queue.qsize(), 'dropped': self._dropped}
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(''.join(json.dumps(span, default=str) + '\n' for spans in batch for span in spans))
+            except OSError as e:
+                print(f"ERROR: Span export failed: {str(e)}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, lines):
+        if self.target == 'stdout':
+            sys.stdout.write(lines)
+            sys.stdout.flush()
+            return
+        if self.max_bytes and os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+            os.replace(self.path, self.path + '.1')
+        with open(self.path, 'a', encoding='utf-8') as trace_file:
+            trace_file.write(lines)
+
+
+def new_span_id():
+    return uuid.uuid4().hex[:16]
+
+
+def current_request_id():
+    trace = _current_trace.get()
+    return trace.request_id if trace else None
+
+
+@contextmanager
+def span(kind, name, **attributes):
+    """Time the enclosed block as a child of the current span; a no-op outside a traced request"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    record = {
+        'request_id': trace.request_id,
+        'span_id': new_span_id(),
+        'parent_id': _current_span.get(),
+        'service': trace.service,
+        'kind': kind,
+        'name': name[:MAX_SPAN_NAME_LENGTH],
+        'start': time.time()
+    }
+    record.update(attributes)
+    token = _current_span.set(record['span_id'])
+    started = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record['error'] = type(e).__name__
+        raise
+    finally:
+        record['duration_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        _current_span.reset(token)
+        trace.add(record)
+
+
+def outgoing_headers(headers=None):
+    """Add X-Request-ID and the current span as X-Parent-Span-ID to an outbound request's headers"""
+    trace = _current_trace.get()
+    if trace is None:
+        return headers
+    headers = dict(headers or {})
+    headers.setdefault(REQUEST_ID_HEADER, trace.request_id)
+    parent_id = _current_span.get()
+    if parent_id:
+        headers.setdefault(PARENT_SPAN_HEADER, parent_id)
+    return headers
+
+
+def submit_in_context(executor, fn, *args, **kwargs):
+    """executor.submit() that runs fn in a copy of the caller's context, so its spans join the request"""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+class TracedCursor:
+    """Cursor proxy recording one sql span per execute/executemany"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, operation, *args, **kwargs):
+        with span('sql', ' '.join(str(operation).split())):
+            return self._cursor.execute(operation, *args, **kwargs)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        with span('sql', ' '.join(str(operation).split()), rows=len(seq_params)):
+            return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class TracedConnection:
+    """Connection proxy whose cursors record sql spans"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return TracedCursor(self._conn.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def trace_connection(conn):
+    """Wrap a pooled connection for sql spans while a traced request is running"""
+    if _current_trace.get() is None:
+        return conn
+    return TracedConnection(conn)
+
+
+def server_timing(trace, handler_ms):
+    """Server-Timing header value: handler time plus total db and http time with their counts"""
+    totals = {}
+    for record in trace.spans:
+        if record['kind'] in ('sql', 'http'):
+            kind = 'db' if record['kind'] == 'sql' else 'http'
+            duration, count = totals.get(kind, (0.0, 0))
+            totals[kind] = (duration + record['duration_ms'], count + 1)
+
+    parts = [f'handler;dur={handler_ms:.1f}']
+    for kind in ('db', 'http'):
+        if kind in totals:
+            duration, count = totals[kind]
+            label = 'queries' if kind == 'db' else 'calls'
+            parts.append(f'{kind};dur={duration:.1f};desc="{count} {label}"')
+    return ', '.join(parts)
+
+
+def init_tracing(app, service_name):
+    """
+    Accept or create X-Request-ID, record a handler span per request, export spans when it ends;
+    returns the SpanExporter
+    """
+    # Read here rather than at import: services import this module before load_dotenv()
+    exporter = SpanExporter(
+        target=os.getenv('TRACE_EXPORT', 'none'),
+        path=os.getenv('TRACE_FILE', 'traces.jsonl'),
+        max_bytes=int(float(os.getenv('TRACE_FILE_MAX_MB', 100)) * 1024 * 1024),
+        queue_size=int(os.getenv('TRACE_QUEUE_SIZE', 1000))
+    )
+
+    @app.before_request
+    def start_trace():
+        request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+        trace = Trace(request_id[:128], service_name)
+        g.trace = trace
+        g.trace_tokens = (
+            _current_trace.set(trace),
+            _current_span.set(request.headers.get(PARENT_SPAN_HEADER))
+        )
+        g.trace_handler = span('handler', f'{request.method} {request.path}')
+        g.trace_handler_record = g.trace_handler.__enter__()
+
+    @app.after_request
+    def finish_trace(response):
+        trace = g.get('trace')
+        handler = g.pop('trace_handler', None)
+        if trace is None or handler is None:
+            return response
+        handler.__exit__(None, None, None)
+
+        handler_record = g.pop('trace_handler_record')
+        handler_record['name'] = (
+            f'{request.method} {request.url_rule.rule if request.url_rule else request.path}'
+        )
+        handler_record['status'] = response.status_code
+
+        response.headers[REQUEST_ID_HEADER] = trace.request_id
+        response.headers['Server-Timing'] = server_timing(trace, handler_record['duration_ms'])
+        exporter.export(trace.spans)
+        return response
+
+    @app.teardown_request
+    def reset_trace(exc):
+        handler = g.pop('trace_handler', None)
+        if handler is not None:
+            # after_request did not run (unhandled error); close the handler span anyway
+            handler.__exit__(None, None, None)
+        tokens = g.pop('trace_tokens', None)
+        if tokens is not None:
+            _current_span.reset(tokens[1])
+            _current_trace.reset(tokens[0])
+
+    return exporter
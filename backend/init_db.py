@@ -84,7 +84,9 @@ def create_database_and_tables():
             status ENUM('on_process', 'on_delivery', 'delivered') DEFAULT 'on_process',
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-            FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE CASCADE
+            FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE CASCADE,
+            INDEX idx_updated_at (updated_at),
+            INDEX idx_customer_username_updated_at (customer_username, updated_at)
         )
         """
         cursor.execute(create_orders_table)
@@ -106,6 +108,34 @@ def create_database_and_tables():
         cursor.execute(create_order_items_table)
         print("Order items table created or already exists.")
 
+        # Create order_tombstones table (deleted orders for delta sync)
+        create_order_tombstones_table = """
+        CREATE TABLE IF NOT EXISTS order_tombstones (
+            order_id INT PRIMARY KEY,
+            customer_username VARCHAR(255) NOT NULL,
+            deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_deleted_at (deleted_at),
+            INDEX idx_customer_username_deleted_at (customer_username, deleted_at)
+        )
+        """
+        cursor.execute(create_order_tombstones_table)
+        print("Order tombstones table created or already exists.")
+
+        # Create order_idempotency_keys table (safe retries of POST /orders)
+        create_order_idempotency_keys_table = """
+        CREATE TABLE IF NOT EXISTS order_idempotency_keys (
+            customer_username VARCHAR(255) NOT NULL,
+            idempotency_key VARCHAR(255) NOT NULL,
+            order_id INT NOT NULL,
+            customer_id INT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (customer_username, idempotency_key),
+            INDEX idx_created_at (created_at)
+        )
+        """
+        cursor.execute(create_order_idempotency_keys_table)
+        print("Order idempotency keys table created or already exists.")
+
         conn.commit()
         print("\n✅ All tables created successfully!")
 
@@ -0,0 +1,60 @@
+"""
+Migration script for idempotent order creation (Idempotency-Key on POST /orders)
+Creates the order_idempotency_keys table.
+Run this script if your database was created before idempotency keys existed.
+"""
+import mysql.connector
+from mysql.connector import Error
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# MySQL Configuration
+db_config = {
+    'host': os.getenv('MYSQL_HOST', 'localhost'),
+    'user': os.getenv('MYSQL_USER', 'root'),
+    'password': os.getenv('MYSQL_PASSWORD', ''),
+    'database': os.getenv('MYSQL_DATABASE', 'pastry_db'),
+    'port': int(os.getenv('MYSQL_PORT', 3306))
+}
+
+def migrate_order_idempotency():
+    """Create the order_idempotency_keys table"""
+    try:
+        conn = mysql.connector.connect(**db_config)
+        cursor = conn.cursor()
+        
+        print("Starting migration: order idempotency keys\n")
+        
+        try:
+            print("1. Creating order_idempotency_keys table...")
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS order_idempotency_keys (
+                    customer_username VARCHAR(255) NOT NULL,
+                    idempotency_key VARCHAR(255) NOT NULL,
+                    order_id INT NOT NULL,
+                    customer_id INT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (customer_username, idempotency_key),
+                    INDEX idx_created_at (created_at)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """)
+            print("   [OK] order_idempotency_keys created or already exists")
+        except Error as e:
+            print(f"   [WARNING] order_idempotency_keys: {e}")
+        
+        conn.commit()
+        print("\n[SUCCESS] Migration completed successfully!")
+        
+        cursor.close()
+        conn.close()
+        
+    except Error as e:
+        print(f"[ERROR] Error during migration: {e}")
+
+if __name__ == '__main__':
+    print("=" * 50)
+    print("ORDER IDEMPOTENCY MIGRATION")
+    print("=" * 50)
+    migrate_order_idempotency()
@@ -0,0 +1,77 @@
+"""
+Migration script for order delta sync (GET /orders?updated_since=)
+Adds the updated_at indexes on orders and creates the order_tombstones table.
+Run this script if your database was created before delta sync existed.
+"""
+import mysql.connector
+from mysql.connector import Error
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# MySQL Configuration
+db_config = {
+    'host': os.getenv('MYSQL_HOST', 'localhost'),
+    'user': os.getenv('MYSQL_USER', 'root'),
+    'password': os.getenv('MYSQL_PASSWORD', ''),
+    'database': os.getenv('MYSQL_DATABASE', 'pastry_db'),
+    'port': int(os.getenv('MYSQL_PORT', 3306))
+}
+
+def migrate_order_sync():
+    """Add updated_at indexes and the order_tombstones table"""
+    try:
+        conn = mysql.connector.connect(**db_config)
+        cursor = conn.cursor()
+        
+        print("Starting migration: order delta sync\n")
+        
+        # Index for admin delta queries
+        try:
+            print("1. Adding orders.idx_updated_at...")
+            cursor.execute("ALTER TABLE orders ADD INDEX idx_updated_at (updated_at)")
+            print("   [OK] idx_updated_at added")
+        except Error as e:
+            print(f"   [WARNING] idx_updated_at: {e}")
+        
+        # Index for customer delta queries
+        try:
+            print("2. Adding orders.idx_customer_username_updated_at...")
+            cursor.execute(
+                "ALTER TABLE orders ADD INDEX idx_customer_username_updated_at (customer_username, updated_at)"
+            )
+            print("   [OK] idx_customer_username_updated_at added")
+        except Error as e:
+            print(f"   [WARNING] idx_customer_username_updated_at: {e}")
+        
+        # Tombstones for deleted orders
+        try:
+            print("3. Creating order_tombstones table...")
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS order_tombstones (
+                    order_id INT PRIMARY KEY,
+                    customer_username VARCHAR(255) NOT NULL,
+                    deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    INDEX idx_deleted_at (deleted_at),
+                    INDEX idx_customer_username_deleted_at (customer_username, deleted_at)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """)
+            print("   [OK] order_tombstones created or already exists")
+        except Error as e:
+            print(f"   [WARNING] order_tombstones: {e}")
+        
+        conn.commit()
+        print("\n[SUCCESS] Migration completed successfully!")
+        
+        cursor.close()
+        conn.close()
+        
+    except Error as e:
+        print(f"[ERROR] Error during migration: {e}")
+
+if __name__ == '__main__':
+    print("=" * 50)
+    print("ORDER DELTA SYNC MIGRATION")
+    print("=" * 50)
+    migrate_order_sync()
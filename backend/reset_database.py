@@ -59,6 +59,8 @@ def reset_database():
         tables = [
             'order_items',  # Child table first
             'orders',       # Then parent
+            'order_tombstones',  # Deleted order ids (delta sync)
+            'order_idempotency_keys',  # Idempotency-Key -> order id (safe retries)
             'menu_items',   # Child table
             'restaurants',  # Parent table
             'customers'     # Independent table
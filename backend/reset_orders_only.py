@@ -75,6 +75,22 @@ def reset_orders_only():
         except Error as e:
             print(f"   ⚠️  orders: {e}")
         
+        # Delete tombstones too, order ids restart at 1 after the reset
+        try:
+            cursor.execute("DELETE FROM order_tombstones")
+            deleted_count = cursor.rowcount
+            print(f"   ✅ order_tombstones: {deleted_count} rows deleted")
+        except Error as e:
+            print(f"   ⚠️  order_tombstones: {e}")
+        
+        # Idempotency keys point at order ids that no longer exist after the reset
+        try:
+            cursor.execute("DELETE FROM order_idempotency_keys")
+            deleted_count = cursor.rowcount
+            print(f"   ✅ order_idempotency_keys: {deleted_count} rows deleted")
+        except Error as e:
+            print(f"   ⚠️  order_idempotency_keys: {e}")
+        
         # Reset AUTO_INCREMENT for orders and order_items only
         print("\n🔄 Mereset AUTO_INCREMENT...")
         
@@ -1,65 +1,58 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import mysql.connector
 from mysql.connector import Error
 import os
+import sys
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from common.conditional import PRIVATE_CACHE_CONTROL, conditional_json
+from common.deadline import init_deadlines
+from common.db import ConnectionPool, load_db_config
+from common.metrics import init_metrics
+from common.tracing import init_tracing
+
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
 
-# MySQL Configuration
-db_config = {
-    'host': os.getenv('MYSQL_HOST', 'localhost'),
-    'user': os.getenv('MYSQL_USER', 'root'),
-    'password': os.getenv('MYSQL_PASSWORD', ''),
-    'database': os.getenv('MYSQL_DATABASE', 'pastry_db'),
-    'port': int(os.getenv('MYSQL_PORT', 3306))
-}
-
-def get_db_connection():
-    """Create and return a database connection"""
-    try:
-        conn = mysql.connector.connect(**db_config)
-        return conn
-    except Error as e:
-        print(f"Error: {e}")
-        return None
+# MySQL connection pool (see common/db.py for DB_POOL_* settings)
+db_pool = ConnectionPool(load_db_config(), name='customer_service')
+
+# X-Request-ID, spans and Server-Timing (see common/tracing.py)
+init_tracing(app, 'customer_service')
+
+# Request timing and pool gauges on GET /metrics (see common/metrics.py)
+init_metrics(app, 'customer_service', db_pools=[db_pool])
+
+# X-Request-Budget-Ms from the caller bounds pool waits and queries (see common/deadline.py)
+init_deadlines(app)
 
 # ==================== CUSTOMER CRUD ====================
 
 @app.route('/customers', methods=['GET'])
 def get_customers():
     """Get all customers"""
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-
     try:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute('SELECT * FROM customers')
-        customers = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return jsonify(customers), 200
+        with db_pool.connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute('SELECT * FROM customers')
+            customers = cursor.fetchall()
+            cursor.close()
+        return conditional_json(customers, cache_control=PRIVATE_CACHE_CONTROL)
     except Error as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/customers/<int:customer_id>', methods=['GET'])
 def get_customer(customer_id):
     """Get specific customer"""
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-
     try:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute('SELECT * FROM customers WHERE id = %s', (customer_id,))
-        customer = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        with db_pool.connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute('SELECT * FROM customers WHERE id = %s', (customer_id,))
+            customer = cursor.fetchone()
+            cursor.close()
 
         if not customer:
             return jsonify({'error': 'Customer not found'}), 404
@@ -71,37 +64,68 @@ def get_customer(customer_id):
 def create_customer():
     """Create new customer"""
     data = request.get_json()
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-
     try:
-        cursor = conn.cursor()
-        query = 'INSERT INTO customers (name, email, phone) VALUES (%s, %s, %s)'
-        cursor.execute(query, (data.get('name'), data.get('email'), data.get('phone')))
-        conn.commit()
-        customer_id = cursor.lastrowid
-        cursor.close()
-        conn.close()
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            query = 'INSERT INTO customers (name, email, phone) VALUES (%s, %s, %s)'
+            cursor.execute(query, (data.get('name'), data.get('email'), data.get('phone')))
+            conn.commit()
+            customer_id = cursor.lastrowid
+            cursor.close()
         return jsonify({'id': customer_id, 'message': 'Customer created successfully'}), 201
     except Error as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/customers/resolve', methods=['POST'])
+def resolve_customer():
+    """
+    Get or create a customer by email (idempotent, safe to call on every checkout)
+    Expected JSON: { "name": "...", "email": "...", "phone": "..." }
+    Returns 200 with the existing id, or 201 with the id of the newly created customer
+    """
+    data = request.get_json(silent=True) or {}
+    name, email, phone = data.get('name'), data.get('email'), data.get('phone')
+    if not email:
+        return jsonify({'error': 'email is required'}), 400
+
+    try:
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            # Repeat customers: one lookup on the UNIQUE email index
+            cursor.execute('SELECT id FROM customers WHERE email = %s', (email,))
+            row = cursor.fetchone()
+            if row:
+                cursor.close()
+                return jsonify({'id': row[0], 'created': False}), 200
+
+            if not name or not phone:
+                cursor.close()
+                return jsonify({'error': 'name and phone are required to create a customer'}), 400
+
+            # A concurrent checkout may insert the same email first; LAST_INSERT_ID(id) then returns that row's id
+            cursor.execute(
+                '''INSERT INTO customers (name, email, phone) VALUES (%s, %s, %s)
+                   ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)''',
+                (name, email, phone)
+            )
+            conn.commit()
+            customer_id = cursor.lastrowid
+            cursor.close()
+        return jsonify({'id': customer_id, 'created': True, 'message': 'Customer created successfully'}), 201
+    except Error as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/customers/<int:customer_id>', methods=['PUT'])
 def update_customer(customer_id):
     """Update customer"""
     data = request.get_json()
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-
     try:
-        cursor = conn.cursor()
-        query = 'UPDATE customers SET name = %s, email = %s, phone = %s WHERE id = %s'
-        cursor.execute(query, (data.get('name'), data.get('email'), data.get('phone'), customer_id))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            query = 'UPDATE customers SET name = %s, email = %s, phone = %s WHERE id = %s'
+            cursor.execute(query, (data.get('name'), data.get('email'), data.get('phone'), customer_id))
+            conn.commit()
+            cursor.close()
         return jsonify({'message': 'Customer updated successfully'}), 200
     except Error as e:
         return jsonify({'error': str(e)}), 500
@@ -109,16 +133,20 @@ def update_customer(customer_id):
 @app.route('/customers/<int:customer_id>', methods=['DELETE'])
 def delete_customer(customer_id):
     """Delete customer"""
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-
     try:
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM customers WHERE id = %s', (customer_id,))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            # The gateway has Order Service delete the customer's orders first; orders placed since
+            # still go with the customer (ON DELETE CASCADE), so tombstone them for delta sync
+            cursor.execute(
+                '''INSERT INTO order_tombstones (order_id, customer_username)
+                   SELECT id, customer_username FROM orders WHERE customer_id = %s
+                   ON DUPLICATE KEY UPDATE customer_username = VALUES(customer_username), deleted_at = CURRENT_TIMESTAMP''',
+                (customer_id,)
+            )
+            cursor.execute('DELETE FROM customers WHERE id = %s', (customer_id,))
+            conn.commit()
+            cursor.close()
         return jsonify({'message': 'Customer deleted successfully'}), 200
     except Error as e:
         return jsonify({'error': str(e)}), 500
@@ -126,7 +154,7 @@ def delete_customer(customer_id):
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check"""
-    return jsonify({'status': 'Customer Service is running'}), 200
+    return jsonify({'status': 'Customer Service is running', 'db_pool': db_pool.stats()}), 200
 
 if __name__ == '__main__':
     port = int(os.getenv('CUSTOMER_SERVICE_PORT', 5001))
@@ -1,110 +1,339 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import mysql.connector
 from mysql.connector import Error
 import os
+import sys
+import threading
+import time
+from collections import deque
 from dotenv import load_dotenv
+from werkzeug.http import generate_etag
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from common.conditional import conditional_body, conditional_json
+from common.deadline import init_deadlines
+from common.db import ConnectionPool, load_db_config
+from common.metrics import init_metrics
+from common.tracing import init_tracing
 
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
 
-# MySQL Configuration
-db_config = {
-    'host': os.getenv('MYSQL_HOST', 'localhost'),
-    'user': os.getenv('MYSQL_USER', 'root'),
-    'password': os.getenv('MYSQL_PASSWORD', ''),
-    'database': os.getenv('MYSQL_DATABASE', 'pastry_db'),
-    'port': int(os.getenv('MYSQL_PORT', 3306))
-}
-
-def get_db_connection():
-    """Create and return a database connection"""
+# MySQL connection pool (see common/db.py for DB_POOL_* settings)
+db_pool = ConnectionPool(load_db_config(), name='menu_service')
+
+# Upper bound for GET /menus?ids=...
+MAX_LOOKUP_IDS = int(os.getenv('MENU_MAX_LOOKUP_IDS', 500))
+
+def parse_ids_arg(value):
+    """Parse a comma separated id list such as "1,2,3" into unique ints, raising ValueError on bad input"""
     try:
-        conn = mysql.connector.connect(**db_config)
-        return conn
+        ids = list(dict.fromkeys(int(part) for part in value.split(',') if part.strip()))
+    except ValueError:
+        raise ValueError('ids must be a comma separated list of integers')
+    if not ids:
+        raise ValueError('ids must contain at least one id')
+    if len(ids) > MAX_LOOKUP_IDS:
+        raise ValueError(f'At most {MAX_LOOKUP_IDS} ids can be looked up at once')
+    return ids
+
+# ==================== CATALOG SNAPSHOT ====================
+
+class MenuCatalog:
+    """
+    In-memory copy of menu_items, versioned and pre-serialized
+
+    Reads are answered from the snapshot: the full list and every restaurant's list are kept as
+    ready-to-send JSON bytes with their ETag. Writes through this service apply the changed row
+    and bump the version immediately. Changes made elsewhere (restaurant deletes cascading to
+    menu_items, other replicas) are picked up by a background reload every refresh_interval
+    seconds, or at once via POST /catalog/refresh.
+
+    Versions start at the load time in milliseconds so they keep increasing across restarts,
+    and the last `history` changes are kept to answer ?since_version= deltas.
+    """
+
+    def __init__(self, refresh_interval=60.0, history=1000):
+        self.refresh_interval = refresh_interval
+        self.version = 0
+        self._lock = threading.Lock()
+        self._items = None     # menu id -> row
+        self._blobs = {}       # None (all menus) or restaurant_id -> (body, etag)
+        self._changes = deque(maxlen=history)  # (version, menu_id, restaurant_id)
+        self._history_floor = 0
+        self._loaded_at = 0.0
+        self._refreshing = False
+        self._reloads = 0
+
+    def _fetch_all(self):
+        with db_pool.connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute('SELECT * FROM menu_items ORDER BY id')
+            rows = cursor.fetchall()
+            cursor.close()
+        return {row['id']: row for row in rows}
+
+    @staticmethod
+    def _serialize(menus):
+        body = (app.json.dumps(menus) + '\n').encode()
+        return body, generate_etag(body)
+
+    def _rebuild_blobs(self, restaurant_ids=None):
+        """Re-serialize the full list and the given restaurants' lists (all restaurants if None)"""
+        menus = list(self._items.values())
+        self._blobs[None] = self._serialize(menus)
+        if restaurant_ids is None:
+            self._blobs = {None: self._blobs[None]}
+            restaurant_ids = {menu['restaurant_id'] for menu in menus}
+        for restaurant_id in restaurant_ids:
+            self._blobs[restaurant_id] = self._serialize(
+                [menu for menu in menus if menu['restaurant_id'] == restaurant_id]
+            )
+
+    def _record_change(self, menu_id, restaurant_id):
+        if len(self._changes) == self._changes.maxlen:
+            # Oldest change falls out of history; deltas from before it need a full sync
+            self._history_floor = self._changes[0][0]
+        self.version += 1
+        self._changes.append((self.version, menu_id, restaurant_id))
+
+    def _ensure_loaded(self):
+        """Load on first use; afterwards start a background reload once refresh_interval has passed"""
+        if self._items is None:
+            items = self._fetch_all()
+            with self._lock:
+                if self._items is None:
+                    self._items = items
+                    self.version = self._history_floor = int(time.time() * 1000)
+                    self._loaded_at = time.monotonic()
+                    self._reloads += 1
+                    self._rebuild_blobs()
+            return
+
+        with self._lock:
+            if self._refreshing or time.monotonic() - self._loaded_at < self.refresh_interval:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._background_refresh, name='menu-catalog-refresh', daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Error as e:
+            print(f"ERROR: Menu catalog refresh failed: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+                self._loaded_at = time.monotonic()
+
+    def refresh(self):
+        """Reload menu_items from MySQL and record whatever changed as new versions"""
+        if self._items is None:
+            self._ensure_loaded()
+            return True
+
+        started_version = self.version
+        items = self._fetch_all()
+        with self._lock:
+            self._loaded_at = time.monotonic()
+            if self.version != started_version:
+                # A write landed while we were reading; its row may be missing here, retry next cycle
+                return False
+            self._reloads += 1
+            changed = False
+            for menu_id, menu in items.items():
+                if self._items.get(menu_id) != menu:
+                    self._record_change(menu_id, menu['restaurant_id'])
+                    changed = True
+            for menu_id, menu in self._items.items():
+                if menu_id not in items:
+                    self._record_change(menu_id, menu['restaurant_id'])
+                    changed = True
+            if changed:
+                self._items = items
+                self._rebuild_blobs()
+            return True
+
+    def apply(self, menu_id, menu):
+        """Record a write made through this service: menu is the row as now stored, None if deleted"""
+        with self._lock:
+            if self._items is None:
+                # Not loaded yet; the first read loads current data anyway
+                return
+            previous = self._items.get(menu_id)
+            if menu is None:
+                if previous is None:
+                    return
+                del self._items[menu_id]
+            else:
+                self._items[menu_id] = menu
+            restaurant_ids = {row['restaurant_id'] for row in (previous, menu) if row}
+            self._record_change(menu_id, (menu or previous)['restaurant_id'])
+            self._rebuild_blobs(restaurant_ids)
+
+    def blob(self, restaurant_id=None):
+        """(body, etag, version) for all menus, or one restaurant's menus"""
+        self._ensure_loaded()
+        with self._lock:
+            blob = self._blobs.get(restaurant_id)
+            if blob is None:
+                blob = self._serialize([])
+            return blob[0], blob[1], self.version
+
+    def get(self, menu_id):
+        self._ensure_loaded()
+        with self._lock:
+            return self._items.get(menu_id)
+
+    def get_many(self, menu_ids):
+        self._ensure_loaded()
+        with self._lock:
+            return [self._items[menu_id] for menu_id in sorted(menu_ids) if menu_id in self._items]
+
+    def changes_since(self, since_version, restaurant_id=None):
+        """Menus changed and ids deleted after since_version, optionally for one restaurant"""
+        self._ensure_loaded()
+        with self._lock:
+            matches = lambda rid: restaurant_id is None or rid == restaurant_id
+            if since_version < self._history_floor or since_version > self.version:
+                # Too old for the kept history, or a version from before a restart
+                return {
+                    'menus': [menu for menu in self._items.values() if matches(menu['restaurant_id'])],
+                    'deleted': [],
+                    'version': self.version,
+                    'full_sync_required': True
+                }
+
+            touched = {}
+            for version, menu_id, rid in self._changes:
+                if version > since_version and matches(rid):
+                    touched[menu_id] = rid
+            return {
+                'menus': [self._items[menu_id] for menu_id in sorted(touched) if menu_id in self._items],
+                'deleted': [{'id': menu_id} for menu_id in sorted(touched) if menu_id not in self._items],
+                'version': self.version,
+                'full_sync_required': False
+            }
+
+    def stats(self):
+        with self._lock:
+            return {
+                'loaded': self._items is not None,
+                'version': self.version,
+                'items': len(self._items or {}),
+                'restaurants': len(self._blobs) - 1 if self._blobs else 0,
+                'changes_kept': len(self._changes),
+                'reloads': self._reloads
+            }
+
+catalog = MenuCatalog(
+    refresh_interval=float(os.getenv('MENU_CATALOG_REFRESH_SECONDS', 60)),
+    history=int(os.getenv('MENU_CATALOG_HISTORY', 1000))
+)
+
+# X-Request-ID, spans and Server-Timing (see common/tracing.py)
+init_tracing(app, 'menu_service')
+
+# Request timing, pool and catalog gauges on GET /metrics (see common/metrics.py)
+init_metrics(app, 'menu_service', db_pools=[db_pool], stats_sources={'menu_catalog': [catalog]})
+
+# X-Request-Budget-Ms from the caller bounds pool waits and queries (see common/deadline.py)
+init_deadlines(app)
+
+def catalog_response(restaurant_id=None):
+    """Serve all menus or one restaurant's menus from the snapshot, or a delta with ?since_version="""
+    try:
+        if 'since_version' in request.args:
+            try:
+                since_version = int(request.args['since_version'])
+            except ValueError:
+                return jsonify({'error': 'since_version must be an integer'}), 400
+            changes = catalog.changes_since(since_version, restaurant_id)
+            response = jsonify(changes)
+            response.headers['X-Catalog-Version'] = str(changes['version'])
+            return response, 200
+
+        body, etag, version = catalog.blob(restaurant_id)
     except Error as e:
-        print(f"Error: {e}")
-        return None
+        return jsonify({'error': str(e)}), 500
+    response = conditional_body(body, etag)
+    response.headers['X-Catalog-Version'] = str(version)
+    return response
+
+def fetch_menu_row(cursor, menu_id):
+    """Read a menu row back after a write so the catalog holds exactly what MySQL stored"""
+    cursor.execute('SELECT * FROM menu_items WHERE id = %s', (menu_id,))
+    return cursor.fetchone()
+
+@app.route('/catalog/refresh', methods=['POST'])
+def refresh_catalog():
+    """Reload the catalog snapshot now (called by the gateway after restaurant deletes)"""
+    try:
+        catalog.refresh()
+    except Error as e:
+        return jsonify({'error': str(e)}), 500
+    return jsonify({'version': catalog.version}), 200
 
 # ==================== MENU CRUD ====================
 
 @app.route('/menus', methods=['GET'])
 def get_menus():
-    """Get all menu items"""
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
+    """
+    Get all menu items (from the catalog snapshot, no database access)
+    ?ids=1,2,3 returns only those items (bulk lookup); ?since_version=N returns only changes after N
+    """
+    if 'ids' not in request.args:
+        return catalog_response()
 
     try:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute('SELECT * FROM menu_items')
-        menus = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return jsonify(menus), 200
+        ids = parse_ids_arg(request.args['ids'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        return conditional_json(catalog.get_many(ids))
     except Error as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/menus/<int:menu_id>', methods=['GET'])
 def get_menu(menu_id):
     """Get specific menu item"""
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-
     try:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute('SELECT * FROM menu_items WHERE id = %s', (menu_id,))
-        menu = cursor.fetchone()
-        cursor.close()
-        conn.close()
-
-        if not menu:
-            return jsonify({'error': 'Menu item not found'}), 404
-        return jsonify(menu), 200
+        menu = catalog.get(menu_id)
     except Error as e:
         return jsonify({'error': str(e)}), 500
 
+    if not menu:
+        return jsonify({'error': 'Menu item not found'}), 404
+    return jsonify(menu), 200
+
 @app.route('/restaurants/<int:restaurant_id>/menus', methods=['GET'])
 def get_restaurant_menus(restaurant_id):
-    """Get menu items for specific restaurant"""
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-
-    try:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute('SELECT * FROM menu_items WHERE restaurant_id = %s', (restaurant_id,))
-        menus = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return jsonify(menus), 200
-    except Error as e:
-        return jsonify({'error': str(e)}), 500
+    """Get menu items for specific restaurant (supports ?since_version= like GET /menus)"""
+    return catalog_response(restaurant_id)
 
 @app.route('/menus', methods=['POST'])
 def create_menu():
     """Create new menu item"""
     data = request.get_json()
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-
     try:
-        cursor = conn.cursor()
-        query = 'INSERT INTO menu_items (restaurant_id, name, price, description) VALUES (%s, %s, %s, %s)'
-        cursor.execute(query, (
-            data.get('restaurant_id'),
-            data.get('name'),
-            data.get('price'),
-            data.get('description', '')
-        ))
-        conn.commit()
-        menu_id = cursor.lastrowid
-        cursor.close()
-        conn.close()
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            query = 'INSERT INTO menu_items (restaurant_id, name, price, description) VALUES (%s, %s, %s, %s)'
+            cursor.execute(query, (
+                data.get('restaurant_id'),
+                data.get('name'),
+                data.get('price'),
+                data.get('description', '')
+            ))
+            conn.commit()
+            menu_id = cursor.lastrowid
+            cursor.close()
+            cursor = conn.cursor(dictionary=True)
+            menu = fetch_menu_row(cursor, menu_id)
+            cursor.close()
+        catalog.apply(menu_id, menu)
         return jsonify({'id': menu_id, 'message': 'Menu item created successfully'}), 201
     except Error as e:
         return jsonify({'error': str(e)}), 500
@@ -113,22 +342,23 @@ def create_menu():
 def update_menu(menu_id):
     """Update menu item"""
     data = request.get_json()
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-
     try:
-        cursor = conn.cursor()
-        query = 'UPDATE menu_items SET name = %s, price = %s, description = %s WHERE id = %s'
-        cursor.execute(query, (
-            data.get('name'),
-            data.get('price'),
-            data.get('description', ''),
-            menu_id
-        ))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            query = 'UPDATE menu_items SET name = %s, price = %s, description = %s WHERE id = %s'
+            cursor.execute(query, (
+                data.get('name'),
+                data.get('price'),
+                data.get('description', ''),
+                menu_id
+            ))
+            conn.commit()
+            cursor.close()
+            cursor = conn.cursor(dictionary=True)
+            menu = fetch_menu_row(cursor, menu_id)
+            cursor.close()
+        if menu:
+            catalog.apply(menu_id, menu)
         return jsonify({'message': 'Menu item updated successfully'}), 200
     except Error as e:
         return jsonify({'error': str(e)}), 500
@@ -136,16 +366,19 @@ def update_menu(menu_id):
 @app.route('/menus/<int:menu_id>', methods=['DELETE'])
 def delete_menu(menu_id):
     """Delete menu item"""
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-
     try:
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM menu_items WHERE id = %s', (menu_id,))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            # The item's order lines go with it (ON DELETE CASCADE); bump the orders for delta sync
+            cursor.execute(
+                '''UPDATE orders o JOIN order_items oi ON oi.order_id = o.id
+                   SET o.updated_at = CURRENT_TIMESTAMP WHERE oi.menu_id = %s''',
+                (menu_id,)
+            )
+            cursor.execute('DELETE FROM menu_items WHERE id = %s', (menu_id,))
+            conn.commit()
+            cursor.close()
+        catalog.apply(menu_id, None)
         return jsonify({'message': 'Menu item deleted successfully'}), 200
     except Error as e:
         return jsonify({'error': str(e)}), 500
@@ -153,7 +386,7 @@ def delete_menu(menu_id):
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check"""
-    return jsonify({'status': 'Menu Service is running'}), 200
+    return jsonify({'status': 'Menu Service is running', 'db_pool': db_pool.stats(), 'catalog': catalog.stats()}), 200
 
 if __name__ == '__main__':
     port = int(os.getenv('MENU_SERVICE_PORT', 5003))
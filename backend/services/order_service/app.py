@@ -1,44 +1,157 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, errorcode
 import requests
+import csv
+import io
+import json
 import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from common.cache import TTLCache
+from common.circuit_breaker import CircuitOpenError, init_circuit_breakers
+from common.conditional import PRIVATE_CACHE_CONTROL, conditional_json
+from common.deadline import DeadlineExceeded, capped_timeout, init_deadlines, without_deadline
+from common.db import ConnectionPool, load_db_config
+from common.events import EventBroker, format_sse
+from common.http_client import ServiceClient
+from common.metrics import init_metrics
+from common.tracing import init_tracing, submit_in_context
+
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
 
-# MySQL Configuration
-db_config = {
-    'host': os.getenv('MYSQL_HOST', 'localhost'),
-    'user': os.getenv('MYSQL_USER', 'root'),
-    'password': os.getenv('MYSQL_PASSWORD', ''),
-    'database': os.getenv('MYSQL_DATABASE', 'pastry_db'),
-    'port': int(os.getenv('MYSQL_PORT', 3306))
-}
+# MySQL connection pool (see common/db.py for DB_POOL_* settings)
+db_pool = ConnectionPool(load_db_config(), name='order_service')
+
+# Order listing
+VALID_STATUSES = ['on_process', 'on_delivery', 'delivered']
+DEFAULT_ORDERS_PAGE_SIZE = int(os.getenv('ORDERS_DEFAULT_PAGE_SIZE', 50))
+MAX_ORDERS_PAGE_SIZE = int(os.getenv('ORDERS_MAX_PAGE_SIZE', 200))
+
+# Bulk status transitions (PATCH /orders/status)
+MAX_BULK_STATUS_IDS = int(os.getenv('ORDERS_MAX_BULK_STATUS_IDS', 500))
+
+# Idempotency-Key on POST /orders: a retry within the window returns the order created by the first attempt
+ORDER_IDEMPOTENCY_RETENTION_HOURS = int(os.getenv('ORDER_IDEMPOTENCY_RETENTION_HOURS', 24))
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+# Expired keys are purged after an order commits, at most once per interval per process
+ORDER_IDEMPOTENCY_PURGE_INTERVAL = float(os.getenv('ORDER_IDEMPOTENCY_PURGE_INTERVAL', 60))
+idempotency_purge_lock = threading.Lock()
+next_idempotency_purge = 0.0
+
+# Export (GET /orders/export): rows pulled from the unbuffered cursor per round
+EXPORT_FETCH_SIZE = int(os.getenv('ORDERS_EXPORT_FETCH_SIZE', 500))
+EXPORT_ORDER_COLUMNS = (
+    'id', 'customer_id', 'customer_username', 'customer_name', 'customer_email', 'customer_phone',
+    'delivery_address', 'payment_method', 'total_price', 'tax', 'status', 'created_at', 'updated_at'
+)
+EXPORT_ITEM_COLUMNS = ('menu_id', 'menu_name', 'quantity', 'price')
+
+# Delta sync (GET /orders?updated_since=)
+ORDER_TOMBSTONE_RETENTION_DAYS = int(os.getenv('ORDER_TOMBSTONE_RETENTION_DAYS', 7))
+# Expired tombstones are purged after a delete commits, at most once per interval per process
+ORDER_TOMBSTONE_PURGE_INTERVAL = float(os.getenv('ORDER_TOMBSTONE_PURGE_INTERVAL', 60))
+tombstone_purge_lock = threading.Lock()
+next_tombstone_purge = 0.0
+# The watermark lags NOW() so rows written by transactions still in flight are picked up next time
+ORDERS_DELTA_SAFETY_SECONDS = int(os.getenv('ORDERS_DELTA_SAFETY_SECONDS', 2))
 
 # Service URLs
 CUSTOMER_SERVICE_URL = os.getenv('CUSTOMER_SERVICE_URL', 'http://localhost:5001')
 RESTAURANT_SERVICE_URL = os.getenv('RESTAURANT_SERVICE_URL', 'http://localhost:5002')
 MENU_SERVICE_URL = os.getenv('MENU_SERVICE_URL', 'http://localhost:5003')
 
-def get_db_connection():
-    """Create and return a database connection"""
-    try:
-        conn = mysql.connector.connect(**db_config)
-        return conn
-    except Error as e:
-        print(f"Error: {e}")
-        return None
+# Keep-alive HTTP clients for validation calls (see common/http_client.py)
+customer_client = ServiceClient(CUSTOMER_SERVICE_URL, name='customer_service', read_timeout=5)
+menu_client = ServiceClient(MENU_SERVICE_URL, name='menu_service', read_timeout=5)
+
+# Validation calls made while creating an order run concurrently on this pool
+validation_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('ORDER_VALIDATION_WORKERS', 16)),
+    thread_name_prefix='order-validation'
+)
+ORDER_VALIDATION_TIMEOUT = float(os.getenv('ORDER_VALIDATION_TIMEOUT', 5))
+
+# Known customer/menu ids, so repeat customers and popular items skip the validation call.
+# Misses are cached too, for a shorter time; deletions are pushed via POST /validation-cache/invalidate
+validation_cache = TTLCache(
+    max_entries=int(os.getenv('VALIDATION_CACHE_MAX_ENTRIES', 10000)),
+    ttl=float(os.getenv('VALIDATION_CACHE_TTL', 300)),
+    name='validation'
+)
+VALIDATION_CACHE_NEGATIVE_TTL = float(os.getenv('VALIDATION_CACHE_NEGATIVE_TTL', 10))
+
+# Validation calls re-raise these, so an open circuit or a spent budget fails the order with
+# 503/504 instead of reporting the customer/menu as missing
+PASS_THROUGH = (CircuitOpenError, DeadlineExceeded)
+
+# Order change events pushed to GET /orders/events subscribers
+order_events = EventBroker(name='orders')
+SSE_HEARTBEAT_INTERVAL = float(os.getenv('SSE_HEARTBEAT_INTERVAL', 15))
+
+# X-Request-ID, spans and Server-Timing (see common/tracing.py)
+init_tracing(app, 'order_service')
+
+# Request timing, pool, cache and event gauges on GET /metrics (see common/metrics.py)
+init_metrics(
+    app, 'order_service',
+    db_pools=[db_pool],
+    http_clients=[customer_client, menu_client],
+    stats_sources={'cache': [validation_cache], 'event_broker': [order_events]}
+)
+
+# X-Request-Budget-Ms from the gateway bounds validation calls and queries (see common/deadline.py)
+init_deadlines(app)
+
+# Customer/Menu Service outages fail validation fast with 503 (see common/circuit_breaker.py)
+init_circuit_breakers(app)
+
+def cache_validity(kind, key, exists, generation=None):
+    """Remember whether a customer/menu id exists; misses expire after VALIDATION_CACHE_NEGATIVE_TTL"""
+    ttl = None if exists else VALIDATION_CACHE_NEGATIVE_TTL
+    validation_cache.set((kind, str(key)), exists, ttl=ttl, generation=generation)
+
+def cached_customer_validity(customer_id):
+    """True/False from the validation cache, None if the customer has to be looked up"""
+    return validation_cache.get(('customer', str(customer_id)))
+
+def split_cached_menu_ids(menu_ids):
+    """Split menu ids into {id: exists} answered by the validation cache and the ids still to look up"""
+    known = {}
+    lookup_ids = []
+    for menu_id in dict.fromkeys(menu_ids):
+        exists = validation_cache.get(('menu', str(menu_id)))
+        if exists is None:
+            lookup_ids.append(menu_id)
+        else:
+            known[menu_id] = exists
+    return known, lookup_ids
+
+def resolved(value):
+    """An already completed future, for validations answered from the cache"""
+    future = Future()
+    future.set_result(value)
+    return future
 
 def validate_customer(customer_id):
     """Validate customer exists in Customer Service"""
+    generation = validation_cache.generation
     try:
-        response = requests.get(f'{CUSTOMER_SERVICE_URL}/customers/{customer_id}', timeout=5)
+        response = customer_client.get(f'/customers/{customer_id}')
+        if response.status_code in (200, 404):
+            cache_validity('customer', customer_id, response.status_code == 200, generation)
         return response.status_code == 200
+    except PASS_THROUGH:
+        raise
     except requests.exceptions.ConnectionError:
         print(f"ERROR: Cannot connect to Customer Service at {CUSTOMER_SERVICE_URL}")
         return False
@@ -49,33 +162,47 @@ def validate_customer(customer_id):
         print(f"ERROR: Customer validation failed: {str(e)}")
         return False
 
-def validate_menu_item(menu_id):
-    """Validate menu item exists in Menu Service"""
+def validate_menu_items(menu_ids):
+    """
+    Validate menu items exist in Menu Service with a single bulk lookup
+    Returns the list of missing ids (empty if all exist), or None if Menu Service is not available
+    """
+    generation = validation_cache.generation
     try:
-        response = requests.get(f'{MENU_SERVICE_URL}/menus/{menu_id}', timeout=5)
-        return response.status_code == 200
+        response = menu_client.get('/menus', params={'ids': ','.join(str(menu_id) for menu_id in menu_ids)})
+        if response.status_code != 200:
+            print(f"ERROR: Menu Service lookup returned {response.status_code}")
+            return None
+        found_ids = {menu['id'] for menu in response.json()}
+        for menu_id in dict.fromkeys(menu_ids):
+            cache_validity('menu', menu_id, menu_id in found_ids, generation)
+        return [menu_id for menu_id in dict.fromkeys(menu_ids) if menu_id not in found_ids]
+    except PASS_THROUGH:
+        raise
     except requests.exceptions.ConnectionError:
         print(f"ERROR: Cannot connect to Menu Service at {MENU_SERVICE_URL}")
-        return False
+        return None
     except requests.exceptions.Timeout:
         print(f"ERROR: Menu Service request timeout")
-        return False
+        return None
     except Exception as e:
         print(f"ERROR: Menu validation failed: {str(e)}")
-        return False
+        return None
 
 def create_customer(name, email, phone):
-    """Create customer in Customer Service and return customer_id"""
+    """Get or create the customer with this email in Customer Service and return customer_id"""
     try:
-        response = requests.post(
-            f'{CUSTOMER_SERVICE_URL}/customers',
-            json={'name': name, 'email': email, 'phone': phone},
-            timeout=5
+        response = customer_client.post(
+            '/customers/resolve',
+            json={'name': name, 'email': email, 'phone': phone}
         )
-        if response.status_code == 201:
+        if response.status_code in (200, 201):
             customer_data = response.json()
+            cache_validity('customer', customer_data.get('id'), True)
             return customer_data.get('id')
         return None
+    except PASS_THROUGH:
+        raise
     except requests.exceptions.ConnectionError:
         print(f"ERROR: Cannot connect to Customer Service at {CUSTOMER_SERVICE_URL}")
         return None
@@ -86,131 +213,92 @@ def create_customer(name, email, phone):
         print(f"ERROR: Customer creation failed: {str(e)}")
         return None
 
-# ==================== ORDER CRUD ====================
-
-@app.route('/orders', methods=['GET'])
-def get_orders():
-    """Get orders based on role"""
-    role = request.args.get('role', 'customer')
-    username = request.args.get('username', '')
-    
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
+def parse_int_arg(args, name, default=None):
+    """Read an integer query parameter, raising ValueError with a readable message"""
+    value = args.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an integer')
 
+def parse_timestamp_arg(args, name):
+    """Read an ISO-8601 date/datetime query parameter, raising ValueError with a readable message"""
+    value = args.get(name)
+    if not value:
+        return None
     try:
-        cursor = conn.cursor(dictionary=True)
-        if role == 'admin':
-            cursor.execute('SELECT * FROM orders ORDER BY id DESC')
-        else:
-            # For customer, get their orders
-            cursor.execute('SELECT * FROM orders WHERE customer_username = %s ORDER BY id DESC', (username,))
-        
-        orders = cursor.fetchall()
-        
-        # Enrich orders with items and menu names
-        for order in orders:
-            cursor.execute('''
-                SELECT oi.menu_id, oi.quantity, oi.price, mi.name as menu_name
-                FROM order_items oi
-                LEFT JOIN menu_items mi ON oi.menu_id = mi.id
-                WHERE oi.order_id = %s
-            ''', (order['id'],))
-            order['items'] = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
-        return jsonify(orders), 200
-    except Error as e:
-        return jsonify({'error': str(e)}), 500
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an ISO-8601 date or datetime (e.g. 2025-11-14 or 2025-11-14T10:00:00)')
 
-@app.route('/orders/<int:order_id>', methods=['GET'])
-def get_order(order_id):
-    """Get specific order with items"""
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
+def build_order_filters(args, role, username):
+    """Build WHERE conditions and params for order listing (uses idx_status / idx_created_at / PRIMARY)"""
+    conditions = []
+    params = []
 
-    try:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute('SELECT * FROM orders WHERE id = %s', (order_id,))
-        order = cursor.fetchone()
+    if role != 'admin':
+        # For customer, only their orders
+        conditions.append('customer_username = %s')
+        params.append(username)
 
-        if not order:
-            cursor.close()
-            conn.close()
-            return jsonify({'error': 'Order not found'}), 404
+    status = args.get('status')
+    if status:
+        if status not in VALID_STATUSES:
+            raise ValueError(f'Invalid status. Must be one of: {VALID_STATUSES}')
+        conditions.append('status = %s')
+        params.append(status)
 
-        # Get order items with menu names
-        cursor.execute('''
-            SELECT oi.menu_id, oi.quantity, oi.price, mi.name as menu_name
-            FROM order_items oi
-            LEFT JOIN menu_items mi ON oi.menu_id = mi.id
-            WHERE oi.order_id = %s
-        ''', (order_id,))
-        order['items'] = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
-        return jsonify(order), 200
-    except Error as e:
-        return jsonify({'error': str(e)}), 500
+    created_from = parse_timestamp_arg(args, 'created_from')
+    if created_from:
+        conditions.append('created_at >= %s')
+        params.append(created_from)
 
-@app.route('/orders', methods=['POST'])
-def create_order():
-    """Create new order (Consumer calls other services for validation)"""
-    data = request.get_json()
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
+    created_to = parse_timestamp_arg(args, 'created_to')
+    if created_to:
+        conditions.append('created_at < %s')
+        params.append(created_to)
 
-    try:
-        # Get or create customer
-        customer_id = data.get('customer_id')
-        
-        # If customer_id not provided, try to create customer from customer info
-        if not customer_id:
-            customer_name = data.get('customer_name')
-            customer_email = data.get('customer_email')
-            customer_phone = data.get('customer_phone')
-            
-            if customer_name and customer_email and customer_phone:
-                # Auto-create customer
-                customer_id = create_customer(customer_name, customer_email, customer_phone)
-                if not customer_id:
-                    return jsonify({
-                        'error': 'Failed to create customer record',
-                        'details': 'Please check if Customer Service is running on port 5001'
-                    }), 503
-            else:
-                return jsonify({
-                    'error': 'customer_id is required, or provide customer_name, customer_email, and customer_phone to auto-create customer'
-                }), 400
-        
-        # Validate customer exists
-        if not validate_customer(customer_id):
-            return jsonify({
-                'error': f'Customer {customer_id} not found or Customer Service is not available',
-                'details': 'Please check if Customer Service is running on port 5001'
-            }), 404
+    before_id = parse_int_arg(args, 'before_id')
+    if before_id is not None:
+        conditions.append('id < %s')
+        params.append(before_id)
 
-        # Validate all menu items
-        items = data.get('items', [])
-        if not items:
-            return jsonify({'error': 'Order must contain at least one item'}), 400
-        
-        for item in items:
-            menu_id = item.get('menu_id')
-            if not menu_id:
-                return jsonify({'error': 'Each item must have a menu_id'}), 400
-            if not validate_menu_item(menu_id):
-                return jsonify({
-                    'error': f'Menu item {menu_id} not found or Menu Service is not available',
-                    'details': 'Please check if Menu Service is running on port 5003'
-                }), 404
+    return conditions, params
 
-        cursor = conn.cursor()
-        
+def attach_order_items(cursor, orders):
+    """Load items for all given orders in one query and attach them as order['items']"""
+    items_by_order = {order['id']: [] for order in orders}
+    if not items_by_order:
+        return orders
+
+    placeholders = ', '.join(['%s'] * len(items_by_order))
+    cursor.execute(f'''
+        SELECT oi.order_id, oi.menu_id, oi.quantity, oi.price, mi.name as menu_name
+        FROM order_items oi
+        LEFT JOIN menu_items mi ON oi.menu_id = mi.id
+        WHERE oi.order_id IN ({placeholders})
+        ORDER BY oi.order_id, oi.id
+    ''', tuple(items_by_order))
+
+    for item in cursor.fetchall():
+        order_id = item.pop('order_id')
+        items_by_order[order_id].append(item)
+
+    for order in orders:
+        order['items'] = items_by_order[order['id']]
+    return orders
+
+def insert_order(conn, customer_id, data, items, idempotency_key=None):
+    """
+    Write the order row and all of its items in one transaction; rolls back on any failure
+    With idempotency_key the key is recorded in the same transaction; a concurrent retry with the
+    same key blocks on it and then fails with ER_DUP_ENTRY, rolling back its second order
+    """
+    conn.start_transaction()
+    cursor = conn.cursor()
+    try:
         # Create order
         query = '''INSERT INTO orders 
                    (customer_id, customer_username, customer_name, customer_email, 
@@ -232,55 +320,546 @@ def create_order():
         
         order_id = cursor.lastrowid
         
-        # Create order items
-        for item in items:
-            item_query = 'INSERT INTO order_items (order_id, menu_id, quantity, price) VALUES (%s, %s, %s, %s)'
-            cursor.execute(item_query, (
-                order_id,
-                item.get('menu_id'),
-                item.get('quantity'),
-                item.get('price')
-            ))
+        # Create order items (executemany sends a single multi-row INSERT)
+        cursor.executemany(
+            'INSERT INTO order_items (order_id, menu_id, quantity, price) VALUES (%s, %s, %s, %s)',
+            [(order_id, item.get('menu_id'), item.get('quantity'), item.get('price')) for item in items]
+        )
         
+        if idempotency_key:
+            cursor.execute(
+                'INSERT INTO order_idempotency_keys (customer_username, idempotency_key, order_id, customer_id) '
+                'VALUES (%s, %s, %s, %s)',
+                (data.get('username') or '', idempotency_key, order_id, customer_id)
+            )
+
+        conn.commit()
+        return order_id
+    except Error:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def purge_expired_idempotency_keys(conn):
+    """
+    Delete idempotency keys past the retention window in a transaction of its own. Inside the order
+    transaction, its range DELETE took the gap lock that concurrent checkouts then insert into (deadlock)
+    """
+    global next_idempotency_purge
+    with idempotency_purge_lock:
+        now = time.monotonic()
+        if now < next_idempotency_purge:
+            return
+        next_idempotency_purge = now + ORDER_IDEMPOTENCY_PURGE_INTERVAL
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            'DELETE FROM order_idempotency_keys WHERE created_at < NOW() - INTERVAL %s HOUR',
+            (ORDER_IDEMPOTENCY_RETENTION_HOURS,)
+        )
         conn.commit()
+    except Error as e:
+        conn.rollback()
+        print(f"ERROR: Idempotency key purge failed: {str(e)}")
+    finally:
+        cursor.close()
+
+def purge_expired_tombstones(conn):
+    """
+    Delete tombstones past the retention window in a transaction of its own, for the same reason as
+    purge_expired_idempotency_keys: concurrent deletes (batched bulk deletes) insert into its gap lock
+    """
+    global next_tombstone_purge
+    with tombstone_purge_lock:
+        now = time.monotonic()
+        if now < next_tombstone_purge:
+            return
+        next_tombstone_purge = now + ORDER_TOMBSTONE_PURGE_INTERVAL
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            'DELETE FROM order_tombstones WHERE deleted_at < NOW() - INTERVAL %s DAY',
+            (ORDER_TOMBSTONE_RETENTION_DAYS,)
+        )
+        conn.commit()
+    except Error as e:
+        conn.rollback()
+        print(f"ERROR: Tombstone purge failed: {str(e)}")
+    finally:
         cursor.close()
-        conn.close()
+
+def find_idempotent_order(username, idempotency_key):
+    """(order_id, customer_id) created earlier with this key within the retention window, or None"""
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT order_id, customer_id FROM order_idempotency_keys '
+            'WHERE customer_username = %s AND idempotency_key = %s AND created_at >= NOW() - INTERVAL %s HOUR',
+            (username or '', idempotency_key, ORDER_IDEMPOTENCY_RETENTION_HOURS)
+        )
+        row = cursor.fetchone()
+        cursor.close()
+    return row
+
+def order_created_response(order_id, customer_id, replayed=False):
+    """201 body of POST /orders; a replayed idempotent request gets the same body plus Idempotent-Replayed"""
+    response = jsonify({
+        'id': order_id,
+        'customer_id': customer_id,
+        'message': 'Order created successfully',
+        'status': 'on_process'
+    })
+    response.status_code = 201
+    if replayed:
+        response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+def fetch_order_summary(cursor, order_id):
+    """Fields needed to route an order event to the right subscribers"""
+    cursor.execute('SELECT id, customer_username, status FROM orders WHERE id = %s', (order_id,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return dict(zip(('id', 'customer_username', 'status'), row))
+
+def tombstone_orders(cursor, orders):
+    """Record deleted orders (summaries) so delta sync clients learn about the deletion"""
+    cursor.executemany(
+        '''INSERT INTO order_tombstones (order_id, customer_username) VALUES (%s, %s)
+           ON DUPLICATE KEY UPDATE customer_username = VALUES(customer_username), deleted_at = CURRENT_TIMESTAMP''',
+        [(order['id'], order['customer_username']) for order in orders]
+    )
+
+def update_order_statuses(conn, order_ids, new_status):
+    """
+    Move many orders to new_status with one set-based UPDATE in one transaction
+    Returns (outcomes by id: updated/unchanged/not_found, summaries of the orders that changed)
+    """
+    placeholders = ', '.join(['%s'] * len(order_ids))
+    conn.start_transaction()
+    cursor = conn.cursor()
+    try:
+        # Lock the rows so the outcomes reported match what the UPDATE changed
+        cursor.execute(
+            f'SELECT id, customer_username, status FROM orders WHERE id IN ({placeholders}) FOR UPDATE',
+            tuple(order_ids)
+        )
+        current = {row[0]: dict(zip(('id', 'customer_username', 'status'), row)) for row in cursor.fetchall()}
+
+        changed_ids = [order_id for order_id, order in current.items() if order['status'] != new_status]
+        if changed_ids:
+            cursor.execute(
+                f"UPDATE orders SET status = %s WHERE id IN ({', '.join(['%s'] * len(changed_ids))})",
+                (new_status, *changed_ids)
+            )
+        conn.commit()
+    except Error:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    outcomes = {}
+    for order_id in order_ids:
+        if order_id not in current:
+            outcomes[order_id] = 'not_found'
+        elif order_id in changed_ids:
+            outcomes[order_id] = 'updated'
+        else:
+            outcomes[order_id] = 'unchanged'
+    changed = [dict(current[order_id], status=new_status) for order_id in changed_ids]
+    return outcomes, changed
+
+def iter_export_rows(cursor):
+    """Yield lists of (order, item) row pairs, EXPORT_FETCH_SIZE rows at a time, from an executed export query"""
+    order_width = len(EXPORT_ORDER_COLUMNS)
+    while True:
+        rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+        if not rows:
+            return
+        yield [(row[:order_width], row[order_width:]) for row in rows]
+
+def export_ndjson(cursor):
+    """One JSON object per line per order, items nested; rows arrive ordered by order id"""
+    current = None
+    for batch in iter_export_rows(cursor):
+        lines = []
+        for order_row, item_row in batch:
+            if current is None or current['id'] != order_row[0]:
+                if current is not None:
+                    lines.append(json.dumps(current, default=str))
+                current = dict(zip(EXPORT_ORDER_COLUMNS, order_row), items=[])
+            if item_row[0] is not None:
+                current['items'].append(dict(zip(EXPORT_ITEM_COLUMNS, item_row)))
+        if lines:
+            yield '\n'.join(lines) + '\n'
+    if current is not None:
+        yield json.dumps(current, default=str) + '\n'
+
+def export_csv(cursor):
+    """One CSV line per order item (orders without items get one line with empty item columns)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(('order_id',) + EXPORT_ORDER_COLUMNS[1:] + EXPORT_ITEM_COLUMNS)
+    for batch in iter_export_rows(cursor):
+        for order_row, item_row in batch:
+            writer.writerow(order_row + item_row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def get_order_changes(role, username, updated_since):
+    """
+    Orders created/modified at or after updated_since, tombstones for orders deleted since then,
+    and the watermark to send as updated_since on the next call
+    """
+    with db_pool.connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute('SELECT NOW() - INTERVAL %s SECOND AS watermark', (ORDERS_DELTA_SAFETY_SECONDS,))
+        watermark = cursor.fetchone()['watermark']
+
+        # Uses idx_updated_at (admin) or idx_customer_username_updated_at (customer)
+        order_query = 'SELECT * FROM orders WHERE updated_at >= %s'
+        tombstone_query = 'SELECT order_id AS id, deleted_at FROM order_tombstones WHERE deleted_at >= %s'
+        params = [updated_since]
+        if role != 'admin':
+            order_query += ' AND customer_username = %s'
+            tombstone_query += ' AND customer_username = %s'
+            params.append(username)
+
+        cursor.execute(order_query + ' ORDER BY id DESC', tuple(params))
+        orders = cursor.fetchall()
+        attach_order_items(cursor, orders)
+
+        cursor.execute(tombstone_query, tuple(params))
+        deleted = cursor.fetchall()
+        cursor.close()
+
+    return {
+        'orders': orders,
+        'deleted': deleted,
+        'watermark': watermark.isoformat(),
+        # Tombstones older than the retention window are purged, so the client must reload everything
+        'full_sync_required': updated_since < watermark - timedelta(days=ORDER_TOMBSTONE_RETENTION_DAYS)
+    }
+
+# ==================== ORDER CRUD ====================
+
+@app.route('/orders', methods=['GET'])
+def get_orders():
+    """
+    Get orders based on role
+    Optional query params: limit, before_id (keyset cursor), status, created_from, created_to
+    When limit or before_id is given the response is a page: { "orders": [...], "next_cursor": id|null }
+    With updated_since the response is a delta: { "orders": [...], "deleted": [...], "watermark": ... }
+    """
+    role = request.args.get('role', 'customer')
+    username = request.args.get('username', '')
+
+    if 'updated_since' in request.args:
+        try:
+            updated_since = parse_timestamp_arg(request.args, 'updated_since')
+            if updated_since is None or updated_since.tzinfo is not None:
+                raise ValueError('updated_since must be the watermark returned by a previous call (no timezone)')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        try:
+            return jsonify(get_order_changes(role, username, updated_since)), 200
+        except Error as e:
+            return jsonify({'error': str(e)}), 500
+
+    paginated = 'limit' in request.args or 'before_id' in request.args
+
+    try:
+        conditions, params = build_order_filters(request.args, role, username)
+        limit = parse_int_arg(request.args, 'limit', DEFAULT_ORDERS_PAGE_SIZE) if paginated else None
+        if limit is not None and not 1 <= limit <= MAX_ORDERS_PAGE_SIZE:
+            raise ValueError(f'limit must be between 1 and {MAX_ORDERS_PAGE_SIZE}')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        with db_pool.connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            query = 'SELECT * FROM orders'
+            if conditions:
+                query += ' WHERE ' + ' AND '.join(conditions)
+            query += ' ORDER BY id DESC'
+            if limit is not None:
+                # Fetch one extra row to know whether another page exists
+                query += ' LIMIT %s'
+                params.append(limit + 1)
+            cursor.execute(query, tuple(params))
+            
+            orders = cursor.fetchall()
+            next_cursor = None
+            if limit is not None and len(orders) > limit:
+                orders = orders[:limit]
+                next_cursor = orders[-1]['id']
+            
+            # Enrich orders with items and menu names
+            attach_order_items(cursor, orders)
+            cursor.close()
+
+        if paginated:
+            return conditional_json({'orders': orders, 'next_cursor': next_cursor}, cache_control=PRIVATE_CACHE_CONTROL)
+        return conditional_json(orders, cache_control=PRIVATE_CACHE_CONTROL)
+    except Error as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/orders/export', methods=['GET'])
+@without_deadline
+def export_orders():
+    """
+    Stream the full order history with items as NDJSON (default) or CSV (?format=csv)
+    Optional created_from / created_to (ISO-8601) filter on created_at.
+    Rows come from an unbuffered cursor in EXPORT_FETCH_SIZE chunks, so memory stays flat
+    however many orders there are; the DB connection is held until the stream ends.
+    """
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+
+    conditions = []
+    params = []
+    try:
+        created_from = parse_timestamp_arg(request.args, 'created_from')
+        created_to = parse_timestamp_arg(request.args, 'created_to')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if created_from:
+        conditions.append('o.created_at >= %s')
+        params.append(created_from)
+    if created_to:
+        conditions.append('o.created_at < %s')
+        params.append(created_to)
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    order_columns = ', '.join(f'o.{column}' for column in EXPORT_ORDER_COLUMNS)
+    query = f'''
+        SELECT {order_columns}, oi.menu_id, mi.name, oi.quantity, oi.price
+        FROM orders o
+        LEFT JOIN order_items oi ON oi.order_id = o.id
+        LEFT JOIN menu_items mi ON oi.menu_id = mi.id
+        {where}
+        ORDER BY o.id, oi.id
+    '''
+
+    try:
+        conn = db_pool.acquire()
+    except Error as e:
+        return jsonify({'error': str(e)}), 500
+    try:
+        # Unbuffered: rows are read from the socket as they are fetched, not loaded up front
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(query, tuple(params))
+    except Error as e:
+        db_pool.release(conn)
+        return jsonify({'error': str(e)}), 500
+
+    serialize = export_csv if export_format == 'csv' else export_ndjson
+
+    def generate():
+        completed = False
+        try:
+            yield from serialize(cursor)
+            cursor.close()
+            completed = True
+        finally:
+            # A client that disconnects mid-export leaves unread rows; drop the connection instead of draining them
+            db_pool.release(conn, discard=not completed)
+
+    if export_format == 'csv':
+        mimetype, extension = 'text/csv', 'csv'
+    else:
+        mimetype, extension = 'application/x-ndjson', 'ndjson'
+    return Response(generate(), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename=orders.{extension}',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/orders/<int:order_id>', methods=['GET'])
+def get_order(order_id):
+    """Get specific order with items"""
+    try:
+        with db_pool.connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute('SELECT * FROM orders WHERE id = %s', (order_id,))
+            order = cursor.fetchone()
+
+            if order:
+                # Get order items with menu names
+                cursor.execute('''
+                    SELECT oi.menu_id, oi.quantity, oi.price, mi.name as menu_name
+                    FROM order_items oi
+                    LEFT JOIN menu_items mi ON oi.menu_id = mi.id
+                    WHERE oi.order_id = %s
+                ''', (order_id,))
+                order['items'] = cursor.fetchall()
+            cursor.close()
+
+        if not order:
+            return jsonify({'error': 'Order not found'}), 404
+        return jsonify(order), 200
+    except Error as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/orders', methods=['POST'])
+def create_order():
+    """
+    Create new order (Consumer calls other services for validation)
+    Customer and menu validation run concurrently under ORDER_VALIDATION_TIMEOUT;
+    a database connection is only taken for the insert phase.
+    """
+    data = request.get_json()
+
+    # A retry of a request that already created its order gets that order back, nothing is re-run
+    idempotency_key = request.headers.get('Idempotency-Key')
+    if idempotency_key is not None:
+        if not idempotency_key or len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+            return jsonify({'error': f'Idempotency-Key must be 1-{MAX_IDEMPOTENCY_KEY_LENGTH} characters'}), 400
+        try:
+            existing = find_idempotent_order(data.get('username'), idempotency_key)
+        except Error as e:
+            return jsonify({'error': str(e)}), 500
+        if existing:
+            return order_created_response(*existing, replayed=True)
+
+    # Get or create customer
+    customer_id = data.get('customer_id')
+    new_customer = None
+    
+    # If customer_id not provided, try to create customer from customer info
+    if not customer_id:
+        customer_name = data.get('customer_name')
+        customer_email = data.get('customer_email')
+        customer_phone = data.get('customer_phone')
         
+        if customer_name and customer_email and customer_phone:
+            new_customer = (customer_name, customer_email, customer_phone)
+        else:
+            return jsonify({
+                'error': 'customer_id is required, or provide customer_name, customer_email, and customer_phone to auto-create customer'
+            }), 400
+
+    items = data.get('items', [])
+    if not items:
+        return jsonify({'error': 'Order must contain at least one item'}), 400
+    
+    menu_ids = []
+    for item in items:
+        try:
+            menu_ids.append(int(item.get('menu_id')))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Each item must have a menu_id'}), 400
+
+    # Auto-create or validate the customer while all menu items are validated in one lookup;
+    # ids already in the validation cache need no call at all
+    if new_customer:
+        customer_future = submit_in_context(validation_executor, create_customer, *new_customer)
+    else:
+        known_customer = cached_customer_validity(customer_id)
+        if known_customer is None:
+            customer_future = submit_in_context(validation_executor, validate_customer, customer_id)
+        else:
+            customer_future = resolved(known_customer)
+    known_menus, lookup_menu_ids = split_cached_menu_ids(menu_ids)
+    if lookup_menu_ids:
+        menu_future = submit_in_context(validation_executor, validate_menu_items, lookup_menu_ids)
+    else:
+        menu_future = resolved([])
+
+    # Never wait longer than the caller's remaining budget
+    validation_timeout = capped_timeout(ORDER_VALIDATION_TIMEOUT, 'order validation')
+    _, pending = wait([customer_future, menu_future], timeout=validation_timeout)
+    if pending:
+        return jsonify({
+            'error': 'Order validation timed out',
+            'details': f'Customer/Menu Service did not answer within {validation_timeout:.2f}s'
+        }), 504
+
+    if new_customer:
+        customer_id = customer_future.result()
+        if not customer_id:
+            return jsonify({
+                'error': 'Failed to create customer record',
+                'details': 'Please check if Customer Service is running on port 5001'
+            }), 503
+    elif not customer_future.result():
+        return jsonify({
+            'error': f'Customer {customer_id} not found or Customer Service is not available',
+            'details': 'Please check if Customer Service is running on port 5001'
+        }), 404
+
+    looked_up_missing = menu_future.result()
+    if looked_up_missing is None:
+        return jsonify({
+            'error': 'Menu Service is not available',
+            'details': 'Please check if Menu Service is running on port 5003'
+        }), 503
+    missing = set(looked_up_missing) | {menu_id for menu_id, exists in known_menus.items() if not exists}
+    missing_menu_ids = [menu_id for menu_id in dict.fromkeys(menu_ids) if menu_id in missing]
+    if missing_menu_ids:
         return jsonify({
-            'id': order_id,
-            'message': 'Order created successfully',
-            'status': 'on_process'
-        }), 201
+            'error': f'Menu item(s) {missing_menu_ids} not found',
+            'missing_menu_ids': missing_menu_ids
+        }), 404
+
+    try:
+        with db_pool.connection() as conn:
+            order_id = insert_order(conn, customer_id, data, items, idempotency_key)
+            if idempotency_key:
+                purge_expired_idempotency_keys(conn)
     except Error as e:
+        if idempotency_key and e.errno == errorcode.ER_DUP_ENTRY:
+            # A concurrent attempt with the same key committed first; answer with its order
+            try:
+                existing = find_idempotent_order(data.get('username'), idempotency_key)
+            except Error as lookup_error:
+                return jsonify({'error': str(lookup_error)}), 500
+            if existing:
+                return order_created_response(*existing, replayed=True)
         return jsonify({'error': str(e)}), 500
 
+    order_events.publish('order_created', {
+        'id': order_id,
+        'customer_username': data.get('username'),
+        'status': 'on_process'
+    })
+    return order_created_response(order_id, customer_id)
+
 @app.route('/orders/<int:order_id>', methods=['PUT'])
 def update_order(order_id):
     """Update order"""
     data = request.get_json()
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-
     try:
-        cursor = conn.cursor()
-        query = '''UPDATE orders SET customer_name = %s, customer_email = %s, 
-                   customer_phone = %s, delivery_address = %s, payment_method = %s, 
-                   total_price = %s, tax = %s WHERE id = %s'''
-        
-        cursor.execute(query, (
-            data.get('customer_name'),
-            data.get('customer_email'),
-            data.get('customer_phone'),
-            data.get('delivery_address'),
-            data.get('payment_method'),
-            data.get('total_price'),
-            data.get('tax'),
-            order_id
-        ))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            query = '''UPDATE orders SET customer_name = %s, customer_email = %s, 
+                       customer_phone = %s, delivery_address = %s, payment_method = %s, 
+                       total_price = %s, tax = %s WHERE id = %s'''
+            
+            cursor.execute(query, (
+                data.get('customer_name'),
+                data.get('customer_email'),
+                data.get('customer_phone'),
+                data.get('delivery_address'),
+                data.get('payment_method'),
+                data.get('total_price'),
+                data.get('tax'),
+                order_id
+            ))
+            conn.commit()
+            order = fetch_order_summary(cursor, order_id)
+            cursor.close()
+
+        if order:
+            order_events.publish('order_updated', order)
         return jsonify({'message': 'Order updated successfully'}), 200
     except Error as e:
         return jsonify({'error': str(e)}), 500
@@ -291,48 +870,184 @@ def update_order_status(order_id):
     data = request.get_json()
     new_status = data.get('status')
     
-    valid_statuses = ['on_process', 'on_delivery', 'delivered']
-    if new_status not in valid_statuses:
-        return jsonify({'error': f'Invalid status. Must be one of: {valid_statuses}'}), 400
-
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
+    if new_status not in VALID_STATUSES:
+        return jsonify({'error': f'Invalid status. Must be one of: {VALID_STATUSES}'}), 400
 
     try:
-        cursor = conn.cursor()
-        cursor.execute('UPDATE orders SET status = %s WHERE id = %s', (new_status, order_id))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('UPDATE orders SET status = %s WHERE id = %s', (new_status, order_id))
+            conn.commit()
+            order = fetch_order_summary(cursor, order_id)
+            cursor.close()
+
+        if order:
+            order_events.publish('order_status_changed', order)
         return jsonify({'message': 'Order status updated successfully', 'status': new_status}), 200
     except Error as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/orders/status', methods=['PATCH'])
+def update_order_statuses_bulk():
+    """
+    Update the status of many orders at once
+    Expected JSON: { "ids": [1, 2, 3], "status": "on_delivery" }
+    """
+    data = request.get_json(silent=True) or {}
+    new_status = data.get('status')
+    order_ids = data.get('ids')
+
+    if new_status not in VALID_STATUSES:
+        return jsonify({'error': f'Invalid status. Must be one of: {VALID_STATUSES}'}), 400
+    if (not isinstance(order_ids, list) or not order_ids
+            or not all(isinstance(order_id, int) and not isinstance(order_id, bool) for order_id in order_ids)):
+        return jsonify({'error': 'ids must be a non-empty list of order ids'}), 400
+    # Drop duplicates, keep request order
+    order_ids = list(dict.fromkeys(order_ids))
+    if len(order_ids) > MAX_BULK_STATUS_IDS:
+        return jsonify({'error': f'Too many ids (max {MAX_BULK_STATUS_IDS})'}), 400
+
+    try:
+        with db_pool.connection() as conn:
+            outcomes, changed = update_order_statuses(conn, order_ids, new_status)
+    except Error as e:
+        return jsonify({'error': str(e)}), 500
+
+    for order in changed:
+        order_events.publish('order_status_changed', order)
+
+    return jsonify({
+        'status': new_status,
+        'updated': len(changed),
+        'results': [{'id': order_id, 'outcome': outcomes[order_id]} for order_id in order_ids]
+    }), 200
+
 @app.route('/orders/<int:order_id>', methods=['DELETE'])
 def delete_order(order_id):
     """Delete order"""
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-
     try:
-        cursor = conn.cursor()
-        # Delete order items first
-        cursor.execute('DELETE FROM order_items WHERE order_id = %s', (order_id,))
-        # Delete order
-        cursor.execute('DELETE FROM orders WHERE id = %s', (order_id,))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            order = fetch_order_summary(cursor, order_id)
+            # Delete order items first
+            cursor.execute('DELETE FROM order_items WHERE order_id = %s', (order_id,))
+            # Delete order
+            cursor.execute('DELETE FROM orders WHERE id = %s', (order_id,))
+            if order:
+                tombstone_orders(cursor, [order])
+            conn.commit()
+            cursor.close()
+            if order:
+                purge_expired_tombstones(conn)
+
+        if order:
+            order_events.publish('order_deleted', order)
         return jsonify({'message': 'Order deleted successfully'}), 200
     except Error as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/orders', methods=['DELETE'])
+def delete_customer_orders():
+    """
+    Delete every order of a customer (?customer_id=), with tombstones and order_deleted events;
+    the gateway calls this before deleting the customer, whose ON DELETE CASCADE would do neither
+    """
+    try:
+        customer_id = parse_int_arg(request.args, 'customer_id')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if customer_id is None:
+        return jsonify({'error': 'customer_id is required'}), 400
+
+    try:
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'SELECT id, customer_username, status FROM orders WHERE customer_id = %s FOR UPDATE',
+                (customer_id,)
+            )
+            orders = [dict(zip(('id', 'customer_username', 'status'), row)) for row in cursor.fetchall()]
+            if orders:
+                tombstone_orders(cursor, orders)
+                # order_items go with their orders (ON DELETE CASCADE)
+                cursor.execute('DELETE FROM orders WHERE customer_id = %s', (customer_id,))
+            conn.commit()
+            cursor.close()
+            if orders:
+                purge_expired_tombstones(conn)
+
+        for order in orders:
+            order_events.publish('order_deleted', order)
+        return jsonify({'message': 'Orders deleted successfully', 'deleted': len(orders)}), 200
+    except Error as e:
+        return jsonify({'error': str(e)}), 500
+
+# ==================== ORDER EVENTS ====================
+
+@app.route('/orders/events', methods=['GET'])
+@without_deadline
+def order_event_stream():
+    """
+    Server-Sent Events stream of order changes (order_created, order_updated,
+    order_status_changed, order_deleted). Admins receive every event, customers
+    only events for their own username. Honors Last-Event-ID for resuming.
+    """
+    role = request.args.get('role', 'customer')
+    username = request.args.get('username', '')
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or 0) or None
+    except ValueError:
+        last_event_id = None
+
+    subscription = order_events.subscribe(last_event_id)
+
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            while not subscription.closed:
+                event = subscription.get(timeout=SSE_HEARTBEAT_INTERVAL)
+                if event is None:
+                    # Comment line keeps proxies from timing out and detects closed clients
+                    yield ': keep-alive\n\n'
+                elif role == 'admin' or event['data'].get('customer_username') == username:
+                    yield format_sse(event)
+        finally:
+            subscription.close()
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/validation-cache/invalidate', methods=['POST'])
+def invalidate_validation_cache():
+    """
+    Forget cached customer/menu validity (called by the gateway after deletions)
+    Expected JSON: { "customer_ids": [1], "menu_ids": [2, 3] }; an empty body clears everything
+    """
+    data = request.get_json(silent=True) or {}
+    customer_ids = data.get('customer_ids') or []
+    menu_ids = data.get('menu_ids') or []
+    if not customer_ids and not menu_ids:
+        validation_cache.clear()
+    else:
+        validation_cache.invalidate(
+            *[('customer', str(customer_id)) for customer_id in customer_ids],
+            *[('menu', str(menu_id)) for menu_id in menu_ids]
+        )
+    return jsonify({'message': 'Validation cache invalidated'}), 200
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check"""
-    return jsonify({'status': 'Order Service is running'}), 200
+    return jsonify({
+        'status': 'Order Service is running',
+        'db_pool': db_pool.stats(),
+        'order_events': order_events.stats(),
+        'validation_cache': validation_cache.stats(),
+        'circuit_breakers': {client.name: client.breaker.stats() for client in (customer_client, menu_client)},
+        'replicas': {client.name: client.replicas.stats() for client in (customer_client, menu_client)}
+    }), 200
 
 if __name__ == '__main__':
     port = int(os.getenv('ORDER_SERVICE_PORT', 5004))
@@ -1,65 +1,58 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import mysql.connector
 from mysql.connector import Error
 import os
+import sys
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from common.conditional import conditional_json
+from common.deadline import init_deadlines
+from common.db import ConnectionPool, load_db_config
+from common.metrics import init_metrics
+from common.tracing import init_tracing
+
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
 
-# MySQL Configuration
-db_config = {
-    'host': os.getenv('MYSQL_HOST', 'localhost'),
-    'user': os.getenv('MYSQL_USER', 'root'),
-    'password': os.getenv('MYSQL_PASSWORD', ''),
-    'database': os.getenv('MYSQL_DATABASE', 'pastry_db'),
-    'port': int(os.getenv('MYSQL_PORT', 3306))
-}
-
-def get_db_connection():
-    """Create and return a database connection"""
-    try:
-        conn = mysql.connector.connect(**db_config)
-        return conn
-    except Error as e:
-        print(f"Error: {e}")
-        return None
+# MySQL connection pool (see common/db.py for DB_POOL_* settings)
+db_pool = ConnectionPool(load_db_config(), name='restaurant_service')
+
+# X-Request-ID, spans and Server-Timing (see common/tracing.py)
+init_tracing(app, 'restaurant_service')
+
+# Request timing and pool gauges on GET /metrics (see common/metrics.py)
+init_metrics(app, 'restaurant_service', db_pools=[db_pool])
+
+# X-Request-Budget-Ms from the caller bounds pool waits and queries (see common/deadline.py)
+init_deadlines(app)
 
 # ==================== RESTAURANT CRUD ====================
 
 @app.route('/restaurants', methods=['GET'])
 def get_restaurants():
     """Get all restaurants"""
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-
     try:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute('SELECT * FROM restaurants')
-        restaurants = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return jsonify(restaurants), 200
+        with db_pool.connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute('SELECT * FROM restaurants')
+            restaurants = cursor.fetchall()
+            cursor.close()
+        return conditional_json(restaurants)
     except Error as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/restaurants/<int:restaurant_id>', methods=['GET'])
 def get_restaurant(restaurant_id):
     """Get specific restaurant"""
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-
     try:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute('SELECT * FROM restaurants WHERE id = %s', (restaurant_id,))
-        restaurant = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        with db_pool.connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute('SELECT * FROM restaurants WHERE id = %s', (restaurant_id,))
+            restaurant = cursor.fetchone()
+            cursor.close()
 
         if not restaurant:
             return jsonify({'error': 'Restaurant not found'}), 404
@@ -71,18 +64,14 @@ def get_restaurant(restaurant_id):
 def create_restaurant():
     """Create new restaurant"""
     data = request.get_json()
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-
     try:
-        cursor = conn.cursor()
-        query = 'INSERT INTO restaurants (name, location) VALUES (%s, %s)'
-        cursor.execute(query, (data.get('name'), data.get('location')))
-        conn.commit()
-        restaurant_id = cursor.lastrowid
-        cursor.close()
-        conn.close()
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            query = 'INSERT INTO restaurants (name, location) VALUES (%s, %s)'
+            cursor.execute(query, (data.get('name'), data.get('location')))
+            conn.commit()
+            restaurant_id = cursor.lastrowid
+            cursor.close()
         return jsonify({'id': restaurant_id, 'message': 'Restaurant created successfully'}), 201
     except Error as e:
         return jsonify({'error': str(e)}), 500
@@ -91,17 +80,13 @@ def create_restaurant():
 def update_restaurant(restaurant_id):
     """Update restaurant"""
     data = request.get_json()
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-
     try:
-        cursor = conn.cursor()
-        query = 'UPDATE restaurants SET name = %s, location = %s WHERE id = %s'
-        cursor.execute(query, (data.get('name'), data.get('location'), restaurant_id))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            query = 'UPDATE restaurants SET name = %s, location = %s WHERE id = %s'
+            cursor.execute(query, (data.get('name'), data.get('location'), restaurant_id))
+            conn.commit()
+            cursor.close()
         return jsonify({'message': 'Restaurant updated successfully'}), 200
     except Error as e:
         return jsonify({'error': str(e)}), 500
@@ -109,16 +94,20 @@ def update_restaurant(restaurant_id):
 @app.route('/restaurants/<int:restaurant_id>', methods=['DELETE'])
 def delete_restaurant(restaurant_id):
     """Delete restaurant"""
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-
     try:
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM restaurants WHERE id = %s', (restaurant_id,))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            # Its menu items and their order lines go with it (ON DELETE CASCADE); bump the orders for delta sync
+            cursor.execute(
+                '''UPDATE orders o
+                   JOIN order_items oi ON oi.order_id = o.id
+                   JOIN menu_items mi ON mi.id = oi.menu_id
+                   SET o.updated_at = CURRENT_TIMESTAMP WHERE mi.restaurant_id = %s''',
+                (restaurant_id,)
+            )
+            cursor.execute('DELETE FROM restaurants WHERE id = %s', (restaurant_id,))
+            conn.commit()
+            cursor.close()
         return jsonify({'message': 'Restaurant deleted successfully'}), 200
     except Error as e:
         return jsonify({'error': str(e)}), 500
@@ -126,7 +115,7 @@ def delete_restaurant(restaurant_id):
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check"""
-    return jsonify({'status': 'Restaurant Service is running'}), 200
+    return jsonify({'status': 'Restaurant Service is running', 'db_pool': db_pool.stats()}), 200
 
 if __name__ == '__main__':
     port = int(os.getenv('RESTAURANT_SERVICE_PORT', 5002))
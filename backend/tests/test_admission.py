@@ -0,0 +1,89 @@
+"""
+AdaptiveLimiter limit updates, driven with synthetic latencies
+
+    cd backend
+    python -m pytest tests
+"""
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from common.admission import NORMAL, WINDOW_SAMPLES, AdaptiveLimiter, OverloadedError, request_limiter
+
+
+def run_rounds(limiter, rounds, concurrency, latency):
+    """Offer concurrency calls per round, release the admitted ones with latency(admitted); returns calls shed"""
+    shed = 0
+    for _ in range(rounds):
+        admitted = 0
+        for _ in range(concurrency):
+            try:
+                limiter.acquire(NORMAL)
+                admitted += 1
+            except OverloadedError:
+                shed += 1
+        for _ in range(admitted):
+            limiter.release(rtt=latency(admitted))
+    return shed
+
+
+def test_limit_waits_for_a_full_window():
+    limiter = AdaptiveLimiter('test', initial_limit=20, min_limit=4, max_limit=200)
+    for _ in range(WINDOW_SAMPLES):
+        limiter._update(0.010, 20)
+    for _ in range(WINDOW_SAMPLES - 1):
+        limiter._update(0.500, 20)
+    assert limiter.limit == 20
+    limiter._update(0.500, 20)
+    assert limiter.limit < 20
+
+
+def test_mixed_latencies_do_not_shrink_the_limit():
+    # 10% of the calls are ~1 ms snapshot lookups / 304s, the rest 30 ms queries
+    rng = random.Random(3)
+    limiter = AdaptiveLimiter('test', initial_limit=20, min_limit=4, max_limit=200)
+    shed = run_rounds(limiter, 300, 6, lambda admitted: 0.002 if rng.random() < 0.1 else 0.030)
+    assert shed == 0
+    assert limiter.limit == 20
+
+
+def test_queueing_shrinks_the_limit():
+    limiter = AdaptiveLimiter('test', initial_limit=20, min_limit=4, max_limit=200)
+    run_rounds(limiter, 200, 3, lambda admitted: 0.030)
+    # The backend serves 4 calls at a time; more queue up and take longer
+    run_rounds(limiter, 400, 60, lambda admitted: 0.030 * max(1, admitted / 4))
+    assert limiter.limit < 20
+
+
+def test_idle_limit_does_not_grow():
+    limiter = AdaptiveLimiter('test', initial_limit=20, min_limit=4, max_limit=200)
+    run_rounds(limiter, 200, 3, lambda admitted: 0.030)
+    assert limiter.limit == 20
+
+
+def test_permanently_slower_backend_is_not_throttled_to_min():
+    limiter = AdaptiveLimiter('test', initial_limit=20, min_limit=4, max_limit=200)
+    run_rounds(limiter, 200, 6, lambda admitted: 0.030)
+    run_rounds(limiter, 3000, 6, lambda admitted: 0.090)
+    assert limiter.limit > limiter.min_limit
+    assert limiter._rtt_noload > 0.030
+
+
+@pytest.mark.parametrize('dropped', [True, False])
+def test_drops_back_off_and_failures_are_not_samples(dropped):
+    limiter = AdaptiveLimiter('test', initial_limit=20, min_limit=4, max_limit=200)
+    limiter.acquire(NORMAL)
+    limiter.release(rtt=None, dropped=dropped)
+    assert limiter.limit == (18 if dropped else 20)
+    assert limiter._window_samples == 0
+
+
+def test_settings_are_read_after_import(monkeypatch):
+    # The gateway imports common.admission before load_dotenv() fills the environment
+    monkeypatch.setenv('ADMISSION_CONTROL', 'off')
+    assert request_limiter('test') is None
+    monkeypatch.setenv('ADMISSION_CONTROL', 'on')
+    assert isinstance(request_limiter('test'), AdaptiveLimiter)
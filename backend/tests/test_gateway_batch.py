@@ -0,0 +1,88 @@
+"""
+POST /api/batch runs its sub-requests concurrently; each must get its own request context
+
+    cd backend
+    python -m pytest tests
+"""
+import importlib.util
+import logging
+import os
+import threading
+import time
+
+import pytest
+from flask import Flask, jsonify
+from werkzeug.serving import make_server
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def start_stub_backend():
+    """Menu Service stand-in that answers slowly enough for the sub-requests to overlap"""
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    stub = Flask('stub_backend')
+
+    @stub.route('/menus/<int:menu_id>', methods=['GET'])
+    def get_menu(menu_id):
+        time.sleep(0.05)
+        return jsonify({'id': menu_id, 'name': 'Croissant', 'price': 25000})
+
+    @stub.route('/health', methods=['GET'])
+    def health():
+        return jsonify({'status': 'ok'})
+
+    server = make_server('127.0.0.1', 0, stub, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture(scope='module')
+def gateway():
+    server = start_stub_backend()
+    backend_url = f'http://127.0.0.1:{server.server_port}'
+    env = {
+        'CUSTOMER_SERVICE_URL': backend_url,
+        'RESTAURANT_SERVICE_URL': backend_url,
+        'MENU_SERVICE_URL': backend_url,
+        'ORDER_SERVICE_URL': backend_url,
+        'CATALOG_CACHE_TTL': '0',
+        'TRACE_EXPORT': 'none'
+    }
+    saved = {key: os.environ.get(key) for key in env}
+    os.environ.update(env)
+    try:
+        path = os.path.join(BACKEND_DIR, 'api_gateway', 'app.py')
+        spec = importlib.util.spec_from_file_location('api_gateway_app', path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        yield module.app
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        server.shutdown()
+
+
+def test_concurrent_batch(gateway):
+    client = gateway.test_client()
+    items = [{'method': 'GET', 'path': f'/api/menus/{menu_id}'} for menu_id in range(1, 5)]
+
+    for _ in range(10):
+        response = client.post('/api/batch', json={'requests': items})
+        assert response.status_code == 200
+        results = response.get_json()['results']
+        assert [result['status'] for result in results] == [200] * 4
+        assert [result['body']['id'] for result in results] == [1, 2, 3, 4]
+        assert response.headers['X-Request-ID']
+
+
+
+def test_batch_rejects_streaming_routes(gateway):
+    client = gateway.test_client()
+    for method, path in (('POST', '/api/batch'), ('GET', '/api/orders/stream'), ('GET', '/api/orders/export?format=csv'),
+                         ('POST', '/api/%62atch'), ('GET', '/api/orders/%73tream'), ('GET', '/api/orders/%65xport')):
+        response = client.post('/api/batch', json={'requests': [{'method': method, 'path': path}]})
+        assert response.status_code == 400
+        assert 'cannot be used inside a batch' in response.get_json()['error']
@@ -0,0 +1,147 @@
+"""
+ServiceClient error classification against a slow stub backend
+
+    cd backend
+    python -m pytest tests
+"""
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+import pytest
+import requests
+from flask import Flask, jsonify
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from common.admission import AdaptiveLimiter
+from common.deadline import _deadline
+from common.http_client import ServiceClient
+
+
+@pytest.fixture(scope='module')
+def slow_backend():
+    """Backend whose /slow answers after 0.5 s; counts the requests it receives"""
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    stub = Flask('slow_backend')
+    stub.hits = 0
+
+    @stub.route('/slow', methods=['GET'])
+    def slow():
+        stub.hits += 1
+        time.sleep(0.5)
+        return jsonify({'status': 'ok'})
+
+    server = make_server('127.0.0.1', 0, stub, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}', stub
+    server.shutdown()
+
+
+@pytest.fixture
+def deadline():
+    """Run the test body inside a request deadline of the given seconds"""
+    tokens = []
+
+    def start(seconds):
+        tokens.append(_deadline.set(time.monotonic() + seconds))
+
+    yield start
+    for token in reversed(tokens):
+        _deadline.reset(token)
+
+
+@pytest.mark.parametrize('retries', [0, 2])
+def test_read_timeout_is_reported_as_timeout(slow_backend, retries):
+    url, _ = slow_backend
+    client = ServiceClient(url, name='slow_service', read_timeout=0.1, retries=retries, retry_backoff=0)
+    with pytest.raises(requests.exceptions.Timeout):
+        client.get('/slow')
+    assert client.breaker.stats()['consecutive_failures'] == 1
+
+
+def test_timeout_cut_short_by_deadline_is_not_a_backend_failure(slow_backend, deadline):
+    url, _ = slow_backend
+    client = ServiceClient(url, name='slow_service', read_timeout=5, retries=0)
+    deadline(0.1)
+    with pytest.raises(requests.exceptions.Timeout):
+        client.get('/slow')
+    assert client.breaker.stats()['consecutive_failures'] == 0
+
+
+def test_slow_replica_is_not_ejected(slow_backend):
+    url, stub = slow_backend
+    client = ServiceClient(url + ',http://127.0.0.1:9', name='slow_service', read_timeout=0.1, retries=0)
+    slow, unreachable = client.replicas.replicas
+    hits = stub.hits
+    # Both replicas start idle, so the balancer picks between them at random
+    random.seed(1)
+    # Fewer calls than CIRCUIT_FAILURE_THRESHOLD, the read timeouts count against the breaker
+    for _ in range(4):
+        with pytest.raises(requests.exceptions.Timeout):
+            client.get('/slow')
+    assert slow.healthy
+    assert unreachable.requests > 0 and not unreachable.healthy
+    # Every call that picked the unreachable replica failed over; none was sent twice to the slow one
+    time.sleep(0.2)
+    assert stub.hits - hits == 4
+
+
+def test_retries_stop_at_the_deadline(slow_backend, deadline):
+    url, stub = slow_backend
+    client = ServiceClient(url, name='slow_service', read_timeout=5, retries=2, retry_backoff=0)
+    hits = stub.hits
+    deadline(0.3)
+    started = time.monotonic()
+    with pytest.raises(requests.exceptions.Timeout):
+        client.get('/slow')
+    assert time.monotonic() - started < 0.45
+    time.sleep(0.2)
+    assert stub.hits - hits == 1
+
+
+def test_idempotent_read_timeouts_are_retried_without_deadline(slow_backend):
+    url, stub = slow_backend
+    client = ServiceClient(url, name='slow_service', read_timeout=0.1, retries=2, retry_backoff=0)
+    hits = stub.hits
+    with pytest.raises(requests.exceptions.Timeout):
+        client.get('/slow')
+    time.sleep(0.2)
+    assert stub.hits - hits == 3
+
+
+def test_streamed_calls_bypass_the_limiter(slow_backend):
+    url, _ = slow_backend
+    limiter = AdaptiveLimiter('slow_service', initial_limit=4, min_limit=1, max_limit=10)
+    client = ServiceClient(url, name='slow_service', read_timeout=5, retries=0, limiter=limiter)
+    client.get('/slow', stream=True).close()
+    assert limiter.stats()['admitted'] == 0
+    client.get('/slow')
+    assert limiter.stats()['admitted'] == 1
+
+
+def test_pinned_calls_fail_over_to_a_new_primary(slow_backend):
+    url, stub = slow_backend
+    client = ServiceClient('http://127.0.0.1:9,' + url, name='slow_service', read_timeout=5, retries=0,
+                           pin_to_primary=lambda method, path: True)
+    down, up = client.replicas.replicas
+    assert client.get('/slow').status_code == 200
+    assert [replica['primary'] for replica in client.replicas.stats()] == [False, True]
+    # The old primary coming back does not take the role back
+    down.healthy = True
+    hits = stub.hits
+    assert client.get('/slow').status_code == 200
+    assert stub.hits - hits == 1
+    assert down.requests == 1
+
+
+def test_primary_calls_are_not_balanced(slow_backend):
+    url, _ = slow_backend
+    client = ServiceClient(url + ',' + url + '/', name='slow_service', read_timeout=5, retries=0)
+    first, second = client.replicas.replicas
+    for _ in range(3):
+        client.get('/slow', primary=True)
+    assert (first.requests, second.requests) == (3, 0)
@@ -0,0 +1,56 @@
+"""
+Span export settings and the background writer
+
+    cd backend
+    python -m pytest tests
+"""
+import json
+import os
+import sys
+
+from flask import Flask
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from common.tracing import SpanExporter, init_tracing
+
+
+def traced_app(monkeypatch, **env):
+    for key, value in env.items():
+        monkeypatch.setenv(key, value)
+    app = Flask('traced')
+
+    @app.route('/ping')
+    def ping():
+        return 'pong'
+
+    return app, init_tracing(app, 'test_service')
+
+
+def test_export_is_off_by_default(monkeypatch, tmp_path):
+    monkeypatch.delenv('TRACE_EXPORT', raising=False)
+    monkeypatch.chdir(tmp_path)
+    app, exporter = traced_app(monkeypatch)
+    response = app.test_client().get('/ping')
+    assert response.headers['X-Request-ID']
+    assert exporter.target == 'none'
+    assert not (tmp_path / 'traces.jsonl').exists()
+
+
+def test_settings_are_read_by_init_tracing(monkeypatch, tmp_path):
+    # Services import common.tracing before load_dotenv() fills the environment
+    path = tmp_path / 'spans.jsonl'
+    app, exporter = traced_app(monkeypatch, TRACE_EXPORT='file', TRACE_FILE=str(path))
+    app.test_client().get('/ping', headers={'X-Request-ID': 'abc'})
+    exporter.flush()
+    spans = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(span['request_id'], span['kind']) for span in spans] == [('abc', 'handler')]
+
+
+def test_file_is_rotated_past_max_size(tmp_path):
+    path = tmp_path / 'spans.jsonl'
+    exporter = SpanExporter(target='file', path=str(path), max_bytes=100)
+    for i in range(5):
+        exporter.export([{'span_id': str(i), 'name': 'x' * 40}])
+        exporter.flush()
+    assert (tmp_path / 'spans.jsonl.1').exists()
+    assert path.stat().st_size <= 200
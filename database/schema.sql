@@ -68,7 +68,9 @@ CREATE TABLE IF NOT EXISTS orders (
     FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE CASCADE,
     INDEX idx_customer_id (customer_id),
     INDEX idx_status (status),
-    INDEX idx_created_at (created_at)
+    INDEX idx_created_at (created_at),
+    INDEX idx_updated_at (updated_at),
+    INDEX idx_customer_username_updated_at (customer_username, updated_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- ============================================
@@ -88,6 +90,32 @@ CREATE TABLE IF NOT EXISTS order_items (
     INDEX idx_menu_id (menu_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+-- ============================================
+-- Table: order_tombstones
+-- Description: Deleted order ids for delta sync (GET /orders?updated_since=)
+-- ============================================
+CREATE TABLE IF NOT EXISTS order_tombstones (
+    order_id INT PRIMARY KEY,
+    customer_username VARCHAR(255) NOT NULL,
+    deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_deleted_at (deleted_at),
+    INDEX idx_customer_username_deleted_at (customer_username, deleted_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- ============================================
+-- Table: order_idempotency_keys
+-- Description: Idempotency-Key of each POST /orders and the order it created, so retries return the same order
+-- ============================================
+CREATE TABLE IF NOT EXISTS order_idempotency_keys (
+    customer_username VARCHAR(255) NOT NULL,
+    idempotency_key VARCHAR(255) NOT NULL,
+    order_id INT NOT NULL,
+    customer_id INT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (customer_username, idempotency_key),
+    INDEX idx_created_at (created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
 -- ============================================
 -- End of Schema
 -- ============================================